@@ -3,7 +3,80 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# База данных (по умолчанию — SQLite-файл рядом с моделями)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app/database/database.db")
+# Профиль настроек SQLite: "performance" (WAL, mmap, кэш) или "default" (настройки SQLite как есть)
+DB_PROFILE = os.getenv("DB_PROFILE", "performance")
+
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # Живёт 7 дней
+# Записи о refresh-токенах копятся в памяти и пишутся в БД пачкой:
+# как только набралось TOKEN_FLUSH_BATCH записей или раз в TOKEN_FLUSH_INTERVAL секунд
+TOKEN_FLUSH_BATCH = int(os.getenv("TOKEN_FLUSH_BATCH", "100"))
+TOKEN_FLUSH_INTERVAL = float(os.getenv("TOKEN_FLUSH_INTERVAL", "1.0"))
+# Сколько записей о refresh-токенах держать в кэше (LRU); остальные читаются из БД по ключу
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Фильтрация программ через in-memory индекс (0 — только SQL)
+USE_PROGRAM_INDEX = os.getenv("USE_PROGRAM_INDEX", "1") == "1"
+
+# Каталог JSON-файлов программ (бенчмарки подставляют сюда синтетические данные)
+CATALOG_DATA_DIR = os.getenv("CATALOG_DATA_DIR", "app/database/static_files/json_data")
+
+# Импорт каталога: число процессов для разбора JSON (1 — без пула, 0 — по числу ядер)
+# и размер пачки строк, которую писатель вставляет за раз
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+# Путь к готовому read-only снимку каталога (см. app/database/build_catalog.py).
+# Если задан — сервер не импортирует данные, а подключает снимок только для чтения
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT")
+
+# Кэш ответов /programs/filter: число записей (0 — выключен) и время жизни в секундах
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "256"))
+FILTER_CACHE_TTL = float(os.getenv("FILTER_CACHE_TTL", "300"))
+
+# Хэширование паролей: стоимость bcrypt (при смене хэши обновляются при входе),
+# число процессов пула и сколько операций может ждать пула, прежде чем отвечать 503
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", "2"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+
+# Логирование: уровень и формат ("text" — человекочитаемый, "json" — одна JSON-строка на событие)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# SQL-запросы дольше порога (в миллисекундах) пишутся в лог медленных запросов (0 — выключено)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# Пакетная фильтрация (/programs/filter/batch): максимум профилей в одном запросе
+BATCH_FILTER_MAX_PROFILES = int(os.getenv("BATCH_FILTER_MAX_PROFILES", "1000"))
+
+# Перезагрузка каталога без рестарта: токен для /admin/* (пустой — админ-API выключен)
+# и период опроса каталога JSON-файлов в секундах (0 — только по команде администратора)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+CATALOG_WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", "0"))
+
+# Допуск запросов к дорогим маршрутам (фильтрация, поиск и фасеты, bcrypt): сколько обрабатывается одновременно,
+# сколько может ждать в очереди и сколько секунд ждать; сверх этого — сразу 503 с Retry-After
+FILTER_CONCURRENCY = int(os.getenv("FILTER_CONCURRENCY", "8"))
+FILTER_QUEUE_LIMIT = int(os.getenv("FILTER_QUEUE_LIMIT", "32"))
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "8"))
+SEARCH_QUEUE_LIMIT = int(os.getenv("SEARCH_QUEUE_LIMIT", "32"))
+LOGIN_CONCURRENCY = int(os.getenv("LOGIN_CONCURRENCY", "4"))
+LOGIN_QUEUE_LIMIT = int(os.getenv("LOGIN_QUEUE_LIMIT", "16"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+
+# Token bucket на клиента (пользователь из access-токена, иначе IP): запросов в секунду
+# и размер всплеска (0 — без ограничения); сверх этого — 429 с Retry-After
+FILTER_RATE = float(os.getenv("FILTER_RATE", "10"))
+FILTER_BURST = int(os.getenv("FILTER_BURST", "20"))
+SEARCH_RATE = float(os.getenv("SEARCH_RATE", "10"))
+SEARCH_BURST = int(os.getenv("SEARCH_BURST", "20"))
+LOGIN_RATE = float(os.getenv("LOGIN_RATE", "0.2"))
+LOGIN_BURST = int(os.getenv("LOGIN_BURST", "5"))
+# Регистрация — своя корзина: новые аккаунты не расходуют попытки входа того же клиента
+REGISTER_RATE = float(os.getenv("REGISTER_RATE", "0.05"))
+REGISTER_BURST = int(os.getenv("REGISTER_BURST", "3"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
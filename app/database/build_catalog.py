@@ -0,0 +1,85 @@
+"""Сборка read-only снимка каталога заранее, вне веб-процесса.
+
+    python -m app.database.build_catalog --output catalog.db
+
+Сервер с CATALOG_SNAPSHOT=catalog.db подключает снимок только для чтения
+(mode=ro&immutable=1) и не выполняет импорт при старте.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database.database import Base, snapshot_uri
+from app.database.models import CATALOG_TABLES, CatalogMeta
+from app.database.generation import GENERATION_KEY
+from app.database.import_data.start_import import start_import
+from app.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def copy_catalog(source: str, target: str):
+    """Копирует снимок через backup API SQLite (снимок при этом могут читать)."""
+    source_connection = sqlite3.connect(snapshot_uri(source), uri=True)
+    target_connection = sqlite3.connect(target)
+    try:
+        source_connection.backup(target_connection)
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+
+def build_catalog(output: str, generation: int = None, base: str = None):
+    """Импортирует static_files во временный файл, индексирует, сжимает и атомарно кладёт в output.
+    generation — номер поколения снимка (перезагрузка продолжает нумерацию текущего каталога).
+    base — прежний снимок: импорт идёт в его копию инкрементально, и программы сохраняют id."""
+    started = time.perf_counter()
+    tmp_path = f"{output}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    if base is not None:
+        copy_catalog(base, tmp_path)
+
+    engine = create_engine(f"sqlite:///{tmp_path}")
+    try:
+        # Только таблицы каталога: пользователи остаются в основной БД сервера
+        Base.metadata.create_all(bind=engine, tables=CATALOG_TABLES)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        start_import(session_factory)
+        if generation is not None:
+            db = session_factory()
+            try:
+                db.merge(CatalogMeta(key=GENERATION_KEY, value=generation))
+                db.commit()
+            finally:
+                db.close()
+
+        with engine.connect() as connection:
+            # Импорт печатает ошибку и откатывается — пустой снимок собирать нельзя
+            if not connection.exec_driver_sql("SELECT COUNT(*) FROM programs").scalar():
+                raise SystemExit("Снимок не собран: в каталоге нет программ")
+            connection.exec_driver_sql("ANALYZE")
+            connection.commit()
+            # immutable-снимок должен быть в обычном журнале и без лишних страниц
+            connection.exec_driver_sql("PRAGMA journal_mode=DELETE")
+            connection.exec_driver_sql("VACUUM")
+    finally:
+        engine.dispose()
+
+    os.replace(tmp_path, output)
+    logger.info("Снимок каталога собран", extra={"fields": {
+        "output": output,
+        "size_kb": os.path.getsize(output) // 1024,
+        "duration_s": round(time.perf_counter() - started, 2),
+    }})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Собрать read-only снимок каталога программ")
+    parser.add_argument("--output", default="app/database/catalog.db", help="Путь к файлу снимка")
+    args = parser.parse_args()
+    setup_logging()
+    build_catalog(args.output)
@@ -1,13 +1,125 @@
-from sqlalchemy import create_engine
+from urllib.parse import quote
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app.config import CATALOG_SNAPSHOT, DATABASE_URL, DB_PROFILE
+from app.database.query_counter import install_query_counter
 
-# Путь к базе данных
-DATABASE_URL = "sqlite:///./app/database/database.db"
+# PRAGMA для каждого нового соединения. WAL позволяет читателям не ждать записи
+# (логины пишут в users), mmap и большой кэш ускоряют чтение каталога
+SQLITE_PROFILES = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # В КБ (отрицательное значение), т. е. 64 МБ
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,  # мс
+    },
+}
+
+
+def to_async_url(url: str) -> str:
+    """Та же БД через асинхронный драйвер aiosqlite — для async-маршрутов."""
+    return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+
+def to_read_only_url(url: str) -> str:
+    """URL того же SQLite-файла, открытого только на чтение (mode=ro)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:") or "uri" in parsed.query:
+        return url
+    return parsed.set(database=f"file:{quote(parsed.database)}").update_query_dict({"mode": "ro", "uri": "true"}).render_as_string(hide_password=False)
+
+
+def snapshot_uri(path: str) -> str:
+    """URI для открытия снимка каталога только на чтение и без блокировок."""
+    return f"file:{quote(path)}?mode=ro&immutable=1"
+
+
+def sqlite_profile_listener(read_only: bool):
+    pragmas = dict(SQLITE_PROFILES[DB_PROFILE])
+    if read_only:
+        # Режим журнала меняет только пишущее соединение
+        pragmas.pop("journal_mode", None)
+
+    def apply_sqlite_profile(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return apply_sqlite_profile
+
+
+# Текущий файл снимка: перезагрузка каталога собирает новый снимок и подменяет путь
+_catalog_snapshot = CATALOG_SNAPSHOT
+
+
+def get_catalog_snapshot():
+    return _catalog_snapshot
+
+
+def set_catalog_snapshot(path: str):
+    """Новые и возвращаемые из пула соединения переподключат снимок при следующей выдаче."""
+    global _catalog_snapshot
+    _catalog_snapshot = path
+
+
+def attach_catalog_snapshot(dbapi_connection, connection_record):
+    # Таблицы каталога берутся из подключённого снимка: в основной БД их нет,
+    # поэтому SQLite находит programs, requirements и т. д. в схеме catalog
+    path = _catalog_snapshot
+    cursor = dbapi_connection.cursor()
+    cursor.execute("ATTACH DATABASE ? AS catalog", (snapshot_uri(path),))
+    cursor.close()
+    connection_record.info["catalog_snapshot"] = path
+
+
+def reattach_catalog_snapshot(dbapi_connection, connection_record, connection_proxy):
+    # Соединение из пула подключено к прежнему снимку — меняем его при выдаче, вне транзакции.
+    # Запросы, уже получившие соединение, дочитывают старый снимок
+    if connection_record.info.get("catalog_snapshot") != _catalog_snapshot:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("DETACH DATABASE catalog")
+        cursor.close()
+        attach_catalog_snapshot(dbapi_connection, connection_record)
+
+
+def setup_engine(sync_engine, read_only: bool):
+    if sync_engine.dialect.name == "sqlite":
+        # PRAGMA до ATTACH, чтобы они относились только к основной БД
+        event.listen(sync_engine, "connect", sqlite_profile_listener(read_only))
+        if CATALOG_SNAPSHOT:
+            event.listen(sync_engine, "connect", attach_catalog_snapshot)
+            event.listen(sync_engine, "checkout", reattach_catalog_snapshot)
+    install_query_counter(sync_engine)
+
+
+# Подключение к SQLite (uri=True нужен, чтобы ATTACH понимал file:...?mode=ro)
+connect_args = {"check_same_thread": False, "uri": True}
+
+# Пишущие движки: пользователи, импорт
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
+async_engine = create_async_engine(to_async_url(DATABASE_URL), connect_args=connect_args)
+
+# Читающие движки: каталог. Отдельные соединения только на чтение не конкурируют с записью
+READ_DATABASE_URL = to_read_only_url(DATABASE_URL)
+read_engine = create_engine(READ_DATABASE_URL, connect_args=connect_args)
+async_read_engine = create_async_engine(to_async_url(READ_DATABASE_URL), connect_args=connect_args)
+
+setup_engine(engine, read_only=False)
+setup_engine(async_engine.sync_engine, read_only=False)
+setup_engine(read_engine, read_only=True)
+setup_engine(async_read_engine.sync_engine, read_only=True)
 
-# Подключение к SQLite
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Базовый класс для моделей
 Base = declarative_base()
@@ -19,3 +131,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Асинхронная сессия для async-маршрутов, которые пишут (пользователи)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Асинхронная сессия только для чтения — для маршрутов каталога
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
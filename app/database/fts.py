@@ -0,0 +1,65 @@
+import re
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Полнотекстовый индекс SQLite FTS5: rowid = programs.id
+CREATE_FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS programs_fts USING fts5(
+    name, university, location, fields, subjects,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+FILL_FTS_SQL = """
+INSERT INTO programs_fts(rowid, name, university, location, fields, subjects)
+SELECT
+    p.id,
+    p.name,
+    u.name,
+    p.location,
+    (SELECT group_concat(f.name, ' | ') FROM program_fields pf
+        JOIN fields_of_study f ON f.id = pf.field_id WHERE pf.program_id = p.id),
+    (SELECT group_concat(s.name, ' | ') FROM program_subjects ps
+        JOIN subjects s ON s.id = ps.subject_id WHERE ps.program_id = p.id)
+FROM programs p
+LEFT JOIN universities u ON u.id = p.university_id
+"""
+
+# Веса колонок для bm25: совпадение в названии программы важнее, чем в предметах
+SEARCH_SQL = """
+SELECT rowid FROM programs_fts
+WHERE programs_fts MATCH :query
+ORDER BY bm25(programs_fts, 10.0, 5.0, 3.0, 2.0, 1.0)
+LIMIT :limit
+"""
+
+
+def rebuild_fts(db: Session):
+    """Пересобирает FTS-индекс в текущей транзакции (вызывается импортом)."""
+    db.execute(text(CREATE_FTS_SQL))
+    db.execute(text("DELETE FROM programs_fts"))
+    db.execute(text(FILL_FTS_SQL))
+
+
+def fts_is_stale(db: Session) -> bool:
+    """True, если FTS-таблицы нет или число строк в ней не совпадает с programs."""
+    exists = db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'programs_fts'")).first()
+    if not exists:
+        return True
+    fts_count = db.execute(text("SELECT COUNT(*) FROM programs_fts")).scalar()
+    return fts_count != db.execute(text("SELECT COUNT(*) FROM programs")).scalar()
+
+
+def to_match_query(user_query: str):
+    """Превращает произвольный текст в безопасный FTS5-запрос: каждое слово — префикс, все через AND."""
+    words = re.findall(r"\w+", user_query or "")
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+def search_program_ids(db: Session, user_query: str, limit: int = -1):
+    """id программ, подходящих под текст, в порядке убывания релевантности (BM25)."""
+    match_query = to_match_query(user_query)
+    if match_query is None:
+        return []
+    rows = db.execute(text(SEARCH_SQL), {"query": match_query, "limit": limit})
+    return [program_id for (program_id,) in rows]
@@ -0,0 +1,46 @@
+from sqlalchemy.orm import Session
+from app.database.database import ReadSessionLocal
+from app.database.models import CatalogMeta
+
+# Номер поколения данных каталога: увеличивается каждым импортом, который что-то изменил.
+# Кэши сверяют с ним свои записи и сбрасываются, когда он меняется
+GENERATION_KEY = "generation"
+
+_data_generation = 0
+
+
+def read_generation(db: Session) -> int:
+    meta = db.get(CatalogMeta, GENERATION_KEY)
+    return meta.value if meta else 0
+
+
+def bump_generation(db: Session) -> int:
+    """Увеличивает поколение в текущей транзакции импорта."""
+    meta = db.get(CatalogMeta, GENERATION_KEY)
+    if meta is None:
+        meta = CatalogMeta(key=GENERATION_KEY, value=0)
+        db.add(meta)
+    meta.value += 1
+    db.flush()
+    return meta.value
+
+
+def get_data_generation() -> int:
+    return _data_generation
+
+
+def set_data_generation(generation: int):
+    """Подменяет поколение, прочитанное заранее (перезагрузка каталога, см. catalog_reload)."""
+    global _data_generation
+    _data_generation = generation
+
+
+def refresh_data_generation(session_factory=ReadSessionLocal) -> int:
+    """Перечитывает поколение из БД (после импорта или подмены каталога)."""
+    global _data_generation
+    db = session_factory()
+    try:
+        _data_generation = read_generation(db)
+    finally:
+        db.close()
+    return _data_generation
@@ -1,55 +1,74 @@
 import json
-from sqlalchemy.orm import Session
+import logging
+import time
 from app.database.models import FieldOfStudy, Subject, fields_subjects
 from app.database.database import SessionLocal
+from app.database.generation import bump_generation
+from app.database.import_data.import_programs import log_import_report
+
+logger = logging.getLogger(__name__)
+
+FOS_FILE = "app/database/static_files/fields_of_study.json"
+
+
+def import_fos(session_factory=SessionLocal):
+    """Импортирует данные в БД одной транзакцией, если таблицы пустые."""
+    db = session_factory()
 
-def import_fos():
-    """Импортирует данные в БД, если таблицы пустые."""
-    db = SessionLocal()
-    
     # Проверяем, есть ли уже данные
     if db.query(FieldOfStudy).first() is None:
-        print("⏳ Импортируем данные в базу...")
+        logger.info("Импортируем направления и предметы в базу")
+        timings = {}
 
-        with open("app/database/static_files/fields_of_study.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
+        try:
+            started = time.perf_counter()
+            with open(FOS_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            timings["parse"] = time.perf_counter() - started
 
-        subjects_cache = {}
+            # Собираем все строки в памяти
+            stage_started = time.perf_counter()
+            field_rows, subject_rows, link_rows = [], [], []
+            subjects_cache = set()
+            for field_id, fos in enumerate(data["fields_of_study"], start=1):
+                field_rows.append({"id": field_id, "name": fos["name"]})
 
-        try:
-            for fos in data["fields_of_study"]:
-                # Добавляем FieldOfStudy
-                field = FieldOfStudy(name=fos["name"])
-                db.add(field)
-                db.commit()
-                db.refresh(field)
-
-                # Добавляем Subject и связи fields_subjects
                 for subject in fos["subjects"]:
-                    subject_id = subject["id"]
-                    subject_name = subject["name"]
-
-                    if subject_id not in subjects_cache:
-                        new_subject = Subject(id=subject_id, name=subject_name)
-                        db.add(new_subject)
-                        db.commit()
-                        db.refresh(new_subject)
-                        subjects_cache[subject_id] = new_subject
-                    else:
-                        new_subject = subjects_cache[subject_id]
+                    if subject["id"] not in subjects_cache:
+                        subjects_cache.add(subject["id"])
+                        subject_rows.append({"id": subject["id"], "name": subject["name"]})
 
                     # Заполняем связь fields_subjects
-                    db.execute(fields_subjects.insert().values(field_id=field.id, subject_id=new_subject.id))
-                    db.commit()
+                    link_rows.append({"field_id": field_id, "subject_id": subject["id"]})
+            timings["build"] = time.perf_counter() - stage_started
+
+            # Вставляем пакетами через executemany
+            stage_started = time.perf_counter()
+            stats = {}
+            for table, rows in (
+                (FieldOfStudy.__table__, field_rows),
+                (Subject.__table__, subject_rows),
+                (fields_subjects, link_rows),
+            ):
+                if rows:
+                    db.execute(table.insert(), rows)
+                stats[table.name] = len(rows)
+            timings["insert"] = time.perf_counter() - stage_started
+            bump_generation(db)
 
-            print("✅ Данные успешно импортированы!")
+            stage_started = time.perf_counter()
+            db.commit()
+            timings["commit"] = time.perf_counter() - stage_started
+            timings["total"] = time.perf_counter() - started
 
-        except Exception as e:
+            log_import_report("fields_of_study", "Направления и предметы импортированы", stats, timings)
+
+        except Exception:
             db.rollback()
-            print(f"❌ Ошибка при импорте: {e}")
+            logger.exception("Ошибка при импорте направлений и предметов")
 
         finally:
             db.close()
     else:
-        print("✅ База уже содержит данные, импорт не требуется.")
-
+        db.close()
+        logger.info("Направления и предметы уже в базе, импорт не требуется")
@@ -1,75 +1,40 @@
 import os
 import json
+import time
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import func, select, bindparam
 from sqlalchemy.orm import Session
 from app.database.database import SessionLocal
-from app.database.models import University, Program, Requirement, FieldOfStudy, Subject, program_requirements, program_fields, program_subjects
+from app.database.fts import rebuild_fts, fts_is_stale
+from app.database.generation import bump_generation
+from app.database.locations import location_keys
+from app.config import IMPORT_WORKERS, IMPORT_BATCH_SIZE, CATALOG_DATA_DIR
+from app.utils import parse_requirement, parse_duration_months, parse_tuition
+from app.services.metrics import import_stage_seconds, import_rows
+from app.database.models import (
+    University, Program, Requirement, FieldOfStudy, Subject, Location, LocationAlias, ImportManifest,
+    program_requirements, program_fields, program_subjects,
+)
+
+logger = logging.getLogger(__name__)
 
 # Директория с JSON-файлами
-DATA_DIR = "app/database/static_files/json_data"
+DATA_DIR = CATALOG_DATA_DIR
+
 
-def process_json_file(filepath, db):
-    """ Обрабатывает один JSON-файл и загружает его в базу """
+def parse_program_file(filepath):
+    """ Читает один JSON-файл и превращает его в простой словарь-запись без обращения к БД """
     with open(filepath, "r", encoding="utf-8") as f:
         data = json.load(f)
 
     # Извлекаем данные из JSON
     course_details = data.get("course_details", {})
     requirements_data = data.get("requirements", {})
-    fields_of_study_data = data.get("field_of_study", [])
-    subjects_data = data.get("subject", [])
-    application_link = data.get("application_link", None)
-
-    # 1. Проверяем, что course_title не None
-    course_title = course_details.get("course_title") or "Unknown Program"
-
-    # 2. Добавляем университет (если не существует)
-    university_name = course_details.get("university") or "Unknown University"
-    university_location = course_details.get("location") or "Unknown Location"
-
-    university = db.query(University).filter_by(name=university_name).first()
-    if not university:
-        university = University(name=university_name, location=university_location)
-        db.add(university)
-        db.flush()  # Сохраняем в памяти, но не коммитим сразу
-
-    # 3. Добавляем программу
-    program = Program(
-        name=course_title,
-        university_id=university.id,
-        location=university_location,
-        duration=course_details.get("duration"),
-        tuition_fees=course_details.get("tuition_fees"),
-        language=course_details.get("language_of_instruction"),
-        mode_of_study=course_details.get("mode_of_study"),
-        application_deadline=(requirements_data.get("application_deadline") or [None])[0],
-        link=application_link  # Добавляем ссылку
-    )
-    db.add(program)
-    db.flush()
-
-    # 4. Добавляем fields_of_study и связываем с программой
-    for field_name in fields_of_study_data:
-        field = db.query(FieldOfStudy).filter_by(name=field_name).first()
-        if not field:
-            field = FieldOfStudy(name=field_name)
-            db.add(field)
-            db.flush()
-        
-        # Добавляем связь
-        db.execute(program_fields.insert().values(program_id=program.id, field_id=field.id))
-
-    # 5. Добавляем subjects и связываем с программой
-    for subject_name in subjects_data:
-        subject = db.query(Subject).filter_by(name=subject_name).first()
-        if not subject:
-            subject = Subject(name=subject_name)
-            db.add(subject)
-            db.flush()
-        
-        # Добавляем связь
-        db.execute(program_subjects.insert().values(program_id=program.id, subject_id=subject.id))
-
-    # 6. Добавляем требования и связываем с программой
+
+    # Собираем требования: (kind, текст для detail, значение для разбора)
     all_requirements = []
 
     # Обрабатываем языковые требования
@@ -77,51 +42,370 @@ def process_json_file(filepath, db):
         if isinstance(req_detail, dict):
             for key, value in req_detail.items():
                 if value:
-                    all_requirements.append(f"{req_type} - {key}: {value}")
+                    all_requirements.append((key, f"{req_type} - {key}: {value}", value))
         elif req_detail:  # Если просто строка, а не вложенный объект
-            all_requirements.append(f"{req_type}: {req_detail}")
+            all_requirements.append((req_type, f"{req_type}: {req_detail}", req_detail))
 
     # Обрабатываем стандартные тесты
     for test_name, test_value in requirements_data.get("standardized_tests", {}).items():
         if test_value:
-            all_requirements.append(f"{test_name}: {test_value}")
+            all_requirements.append((test_name, f"{test_name}: {test_value}", test_value))
 
     # Обрабатываем другие требования (например, GPA)
     if requirements_data.get("GPA"):
-        all_requirements.append(f"GPA: {requirements_data.get('GPA')}")
+        all_requirements.append(("GPA", f"GPA: {requirements_data.get('GPA')}", requirements_data.get("GPA")))
+
+    duration_months = parse_duration_months(course_details.get("duration"))
+    tuition_amount, tuition_currency, tuition_period = parse_tuition(course_details.get("tuition_fees"), duration_months)
+
+    return {
+        "name": course_details.get("course_title") or "Unknown Program",
+        "university": course_details.get("university") or "Unknown University",
+        "location": course_details.get("location") or "Unknown Location",
+        "duration": course_details.get("duration"),
+        "tuition_fees": course_details.get("tuition_fees"),
+        "duration_months": duration_months,
+        "tuition_amount": tuition_amount,
+        "tuition_currency": tuition_currency,
+        "tuition_period": tuition_period,
+        "language": course_details.get("language_of_instruction"),
+        "mode_of_study": course_details.get("mode_of_study"),
+        "application_deadline": (requirements_data.get("application_deadline") or [None])[0],
+        "link": data.get("application_link", None),
+        # dict.fromkeys убирает повторы, сохраняя порядок
+        "fields": list(dict.fromkeys(data.get("field_of_study", []))),
+        "subjects": list(dict.fromkeys(data.get("subject", []))),
+        "requirements": [
+            (requirement_text, *parse_requirement(req_kind, req_value))
+            for req_kind, requirement_text, req_value in all_requirements
+        ],
+    }
+
+
+class CatalogWriter:
+    """ Пакетная запись программ: справочники кэшируются в dict, строки копятся в памяти
+    и вставляются через executemany. Коммит делает вызывающий код — весь импорт идёт
+    одной транзакцией. """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+        # Предзагружаем справочники: имя -> id
+        self.universities = {name: id_ for id_, name in db.query(University.id, University.name)}
+        self.fields = {name: id_ for id_, name in db.query(FieldOfStudy.id, FieldOfStudy.name)}
+        self.subjects = {name: id_ for id_, name in db.query(Subject.id, Subject.name)}
+        self.requirements = {
+            detail: id_ for id_, detail in db.query(Requirement.id, Requirement.detail).filter(Requirement.type == "General")
+        }
+        # Места: свёрнутый алиас -> id и id -> каноническое имя
+        self.location_aliases = {alias: id_ for alias, id_ in db.query(LocationAlias.alias, LocationAlias.location_id)}
+        self.location_names = {id_: name for id_, name in db.query(Location.id, Location.name)}
+
+        # Следующие свободные id — назначаем их сами, чтобы сразу строить связи
+        self.next_ids = {
+            model: (db.query(func.max(model.id)).scalar() or 0) + 1
+            for model in (University, Program, Requirement, FieldOfStudy, Subject, Location)
+        }
+
+        self.rows = {table: [] for table in (
+            Location.__table__, LocationAlias.__table__,
+            University.__table__, FieldOfStudy.__table__, Subject.__table__, Requirement.__table__,
+            Program.__table__, program_fields, program_subjects, program_requirements,
+        )}
+        self.program_updates = []  # строки программ изменённых файлов — обновляются на месте, id не меняется
+        self.stats = {}  # имя таблицы -> число вставленных строк
+
+    def _new_id(self, model):
+        new_id = self.next_ids[model]
+        self.next_ids[model] += 1
+        return new_id
+
+    def _lookup(self, cache, model, key, row):
+        """ Возвращает id из кэша или заводит новую строку справочника """
+        if key not in cache:
+            cache[key] = self._new_id(model)
+            self.rows[model.__table__].append({"id": cache[key], **row})
+        return cache[key]
+
+    def _location(self, name):
+        """ id места по любому написанию; новое место получает все свои ещё не занятые алиасы """
+        keys = location_keys(name)
+        for key in keys:
+            if key in self.location_aliases:
+                return self.location_aliases[key]
+
+        location_id = self._new_id(Location)
+        self.location_names[location_id] = name
+        self.rows[Location.__table__].append({"id": location_id, "name": name})
+        for key in keys:
+            if key not in self.location_aliases:
+                self.location_aliases[key] = location_id
+                self.rows[LocationAlias.__table__].append({"alias": key, "location_id": location_id})
+        return location_id
+
+    def add(self, record, program_id=None):
+        """ Добавляет запись из parse_program_file и возвращает id программы.
+        С program_id — обновляет существующую программу: строка и её связи заменяются, id сохраняется. """
+        university_id = self._lookup(
+            self.universities, University, record["university"],
+            {"name": record["university"], "location": record["location"]},
+        )
+
+        location_id = self._location(record["location"])
+
+        row = {
+            "name": record["name"],
+            "university_id": university_id,
+            "location": self.location_names[location_id],
+            "location_id": location_id,
+            "duration": record["duration"],
+            "tuition_fees": record["tuition_fees"],
+            "duration_months": record["duration_months"],
+            "tuition_amount": record["tuition_amount"],
+            "tuition_currency": record["tuition_currency"],
+            "tuition_period": record["tuition_period"],
+            "language": record["language"],
+            "mode_of_study": record["mode_of_study"],
+            "application_deadline": record["application_deadline"],
+            "link": record["link"],
+        }
+        if program_id is None:
+            program_id = self._new_id(Program)
+            self.rows[Program.__table__].append({"id": program_id, **row})
+        else:
+            self.program_updates.append({"program_id": program_id, **row})
+
+        for field_name in record["fields"]:
+            field_id = self._lookup(self.fields, FieldOfStudy, field_name, {"name": field_name})
+            self.rows[program_fields].append({"program_id": program_id, "field_id": field_id})
+
+        for subject_name in record["subjects"]:
+            subject_id = self._lookup(self.subjects, Subject, subject_name, {"name": subject_name})
+            self.rows[program_subjects].append({"program_id": program_id, "subject_id": subject_id})
+
+        linked = set()
+        for requirement_text, kind, min_score, is_mandatory in record["requirements"]:
+            requirement_id = self._lookup(self.requirements, Requirement, requirement_text, {
+                "type": "General",
+                "detail": requirement_text,
+                "kind": kind,
+                "min_score": min_score,
+                "is_mandatory": is_mandatory,
+            })
+            if requirement_id not in linked:
+                linked.add(requirement_id)
+                self.rows[program_requirements].append({"program_id": program_id, "requirement_id": requirement_id})
+
+        return program_id
+
+    def flush(self):
+        """ Вставляет накопленные строки (справочники раньше связей) """
+        for table, rows in self.rows.items():
+            if rows:
+                self.db.execute(table.insert(), rows)
+                self.stats[table.name] = self.stats.get(table.name, 0) + len(rows)
+                rows.clear()
+            if table is Program.__table__ and self.program_updates:
+                # Старые связи обновляемых программ удаляются до вставки новых (они идут дальше по порядку)
+                delete_program_links(self.db, [row["program_id"] for row in self.program_updates])
+                self.db.execute(
+                    Program.__table__.update().where(Program.id == bindparam("program_id")),
+                    self.program_updates,
+                )
+                self.stats["programs_updated"] = self.stats.get("programs_updated", 0) + len(self.program_updates)
+                self.program_updates.clear()
 
-    # Добавляем все найденные требования в БД и связываем с программой
-    for requirement_text in all_requirements:
-        requirement = db.query(Requirement).filter_by(type="General", detail=requirement_text).first()
-        if not requirement:
-            requirement = Requirement(type="General", detail=requirement_text)
-            db.add(requirement)
-            db.flush()
 
-        # Связываем requirement с program
-        db.execute(program_requirements.insert().values(program_id=program.id, requirement_id=requirement.id))
+def log_import_report(importer, message, stats, timings, **fields):
+    """ Пишет в лог число строк по таблицам и время по этапам и обновляет метрики импорта """
+    for table_name, count in stats.items():
+        import_rows.set(count, importer, table_name)
+    for stage, seconds in timings.items():
+        import_stage_seconds.set(seconds, importer, stage)
+    logger.info(message, extra={"fields": {
+        "importer": importer,
+        **fields,
+        "rows": stats,
+        "timings_s": {stage: round(seconds, 4) for stage, seconds in timings.items()},
+    }})
 
-    db.commit()  # Один коммит в конце для повышения производительности
 
-    print(f"✅ Импортирована программа: {course_title} (с {len(all_requirements)} требованиями)")
+def iter_program_records(filepaths, workers=1):
+    """ Отдаёт записи parse_program_file в порядке файлов.
+    При workers > 1 файлы разбираются пулом процессов параллельно с записью в БД.
+    Процессы запускаются через forkserver (или spawn), а не fork: импорт идёт и из фонового
+    потока работающего сервера (перезагрузка каталога), а fork многопоточного процесса небезопасен. """
+    if workers <= 1:
+        for filepath in filepaths:
+            yield parse_program_file(filepath)
+        return
 
-def import_all_programs():
-    """ Обрабатывает все JSON-файлы в папке DATA_DIR """
-    db = SessionLocal()
+    chunksize = max(1, len(filepaths) // (workers * 4))
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method)) as pool:
+        yield from pool.map(parse_program_file, filepaths, chunksize=chunksize)
+
+
+def file_hash(filepath):
+    """ sha256 содержимого файла """
+    with open(filepath, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def scan_data_dir(db: Session):
+    """ Сравнивает DATA_DIR с манифестом.
+    Возвращает (новые/изменённые файлы: [(имя, хэш, stat)], удалённые записи манифеста, обновления stat).
+    Файл читается и хэшируется только если его mtime/size отличаются от манифеста. """
+    manifest = {entry.path: entry for entry in db.query(ImportManifest)}
+    changed, touched = [], []
+    seen = set()
+
+    for entry in os.scandir(DATA_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        seen.add(entry.name)
+        stat = entry.stat()
+        known = manifest.get(entry.name)
+        if known is not None and known.mtime == stat.st_mtime and known.size == stat.st_size:
+            continue
+
+        content_hash = file_hash(entry.path)
+        if known is not None and known.content_hash == content_hash:
+            touched.append((entry.name, stat))  # Содержимое то же — обновим только stat
+        else:
+            changed.append((entry.name, content_hash, stat))
+
+    removed = [known for path, known in manifest.items() if path not in seen]
+    changed.sort()
+    return changed, removed, touched
+
+
+def delete_program_links(db: Session, program_ids):
+    """ Удаляет связи программ с направлениями, предметами и требованиями """
+    program_ids = list(program_ids)
+    for start in range(0, len(program_ids), 500):
+        chunk = program_ids[start:start + 500]
+        for table in (program_fields, program_subjects, program_requirements):
+            db.execute(table.delete().where(table.c.program_id.in_(chunk)))
+
+
+def delete_programs(db: Session, program_ids):
+    """ Удаляет программы вместе с их связями """
+    program_ids = list(program_ids)
+    delete_program_links(db, program_ids)
+    for start in range(0, len(program_ids), 500):
+        db.execute(Program.__table__.delete().where(Program.id.in_(program_ids[start:start + 500])))
+
+
+def import_all_programs(workers=IMPORT_WORKERS, batch_size=IMPORT_BATCH_SIZE, session_factory=SessionLocal, session=None):
+    """ Инкрементально синхронизирует программы с JSON-файлами из DATA_DIR одной транзакцией.
+    Разбираются только новые и изменённые файлы (по манифесту): программы изменённых файлов
+    обновляются на месте и сохраняют id, удаляются только программы удалённых файлов.
+    Разбор идёт в `workers` процессах, единственный писатель вставляет записи пачками по `batch_size`.
+    Возвращает число добавленных, изменённых и удалённых файлов.
+    С session импорт идёт в переданной сессии и не коммитится — коммит и закрытие за вызывающим
+    (перезагрузка каталога коммитит вместе с подменой индексов). """
+    db = session if session is not None else session_factory()
+    timings = {}
+    workers = workers or os.cpu_count() or 1
 
     try:
-        files_processed = 0
-        for filename in os.listdir(DATA_DIR):
-            if filename.endswith(".json"):
-                filepath = os.path.join(DATA_DIR, filename)
-                process_json_file(filepath, db)
-                files_processed += 1
+        started = time.perf_counter()
+        changed, removed, touched = scan_data_dir(db)
+        timings["scan"] = time.perf_counter() - started
+
+        # Программы, которых нет в манифесте (например, дубли от старых импортов), тоже удаляем
+        manifest_ids = select(ImportManifest.program_id).where(ImportManifest.program_id.isnot(None))
+        orphan_ids = [id_ for (id_,) in db.query(Program.id).filter(Program.id.notin_(manifest_ids))]
+
+        if not changed and not removed and not orphan_ids:
+            for path, stat in touched:
+                db.query(ImportManifest).filter_by(path=path).update({"mtime": stat.st_mtime, "size": stat.st_size})
+            if fts_is_stale(db):
+                rebuild_fts(db)
+            if session is None:
+                db.commit()
+            log_import_report("programs", "Программы актуальны, импорт не требуется", {}, timings, changed=0)
+            return 0
+
+        # Изменённые файлы сохраняют свою программу (если она ещё есть), удаляются только программы удалённых файлов.
+        # Записи манифеста тех и других пересоздаются ниже
+        stage_started = time.perf_counter()
+        changed_paths = [path for path, _, _ in changed]
+        stale = db.query(ImportManifest).filter(ImportManifest.path.in_(changed_paths)).all() if changed_paths else []
+        kept_ids = {entry.path: entry.program_id for entry in stale if entry.program_id is not None}
+        existing = set()
+        kept = list(kept_ids.values())
+        for start in range(0, len(kept), 500):
+            existing.update(id_ for (id_,) in db.query(Program.id).filter(Program.id.in_(kept[start:start + 500])))
+        kept_ids = {path: program_id for path, program_id in kept_ids.items() if program_id in existing}
+        delete_programs(db, orphan_ids + [entry.program_id for entry in removed if entry.program_id is not None])
+        for entry in stale + removed:
+            db.delete(entry)
+        db.flush()
+        timings["delete"] = time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        writer = CatalogWriter(db)
+        timings["preload"] = time.perf_counter() - stage_started
+
+        # Писатель забирает готовые записи по мере разбора; время ожидания разбора
+        # считается как parse, время построения строк и вставки — как write
+        filepaths = [os.path.join(DATA_DIR, path) for path in changed_paths]
+        manifest_rows = []
+        write_time = 0.0
+        pending = 0
+        stage_started = time.perf_counter()
+        for (path, content_hash, stat), record in zip(changed, iter_program_records(filepaths, workers)):
+            write_started = time.perf_counter()
+            program_id = writer.add(record, kept_ids.get(path))
+            manifest_rows.append({
+                "path": path,
+                "content_hash": content_hash,
+                "program_id": program_id,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+            })
+            pending += 1
+            if pending >= batch_size:
+                writer.flush()
+                pending = 0
+            write_time += time.perf_counter() - write_started
+
+        write_started = time.perf_counter()
+        writer.flush()
+        if manifest_rows:
+            db.execute(ImportManifest.__table__.insert(), manifest_rows)
+        for path, stat in touched:
+            db.query(ImportManifest).filter_by(path=path).update({"mtime": stat.st_mtime, "size": stat.st_size})
+        write_time += time.perf_counter() - write_started
+        timings["parse"] = time.perf_counter() - stage_started - write_time
+        timings["write"] = write_time
+
+        stage_started = time.perf_counter()
+        rebuild_fts(db)
+        timings["fts"] = time.perf_counter() - stage_started
+
+        generation = bump_generation(db)
+
+        if session is None:
+            stage_started = time.perf_counter()
+            db.commit()
+            timings["commit"] = time.perf_counter() - stage_started
+        timings["total"] = time.perf_counter() - started
 
-        if files_processed == 0:
-            print("⚠️ В папке нет JSON-файлов для обработки.")
+        writer.stats["import_manifest"] = len(manifest_rows)
+        log_import_report(
+            "programs", "Импорт программ завершён", writer.stats, timings,
+            changed=len(changed), removed=len(removed), orphans=len(orphan_ids),
+            workers=workers, generation=generation,
+        )
+        return len(changed) + len(removed) + len(orphan_ids)
 
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Ошибка при импорте программ: {e}")
+        logger.exception("Ошибка при импорте программ")
+        return 0
     finally:
-        db.close()
\ No newline at end of file
+        if session is None:
+            db.close()
@@ -1,8 +1,10 @@
+from app.database.database import SessionLocal
 from app.database.import_data.import_fos import import_fos
 from app.database.import_data.import_programs import import_all_programs
 
 
 
-def start_import():
-    import_fos()
-    import_all_programs()
\ No newline at end of file
+def start_import(session_factory=SessionLocal, session=None):
+    """session — импорт программ без коммита (см. import_all_programs)."""
+    import_fos(session_factory)
+    return import_all_programs(session_factory=session_factory, session=session)
@@ -0,0 +1,54 @@
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.database.models import LocationAlias
+from app.utils import fold_text
+
+# Синонимы мест, которых не получить сворачиванием написания: каноническое имя -> другие названия
+LOCATION_ALIASES = {
+    "München": ["Munich"],
+    "Köln": ["Cologne"],
+    "Nürnberg": ["Nuremberg"],
+    "Hannover": ["Hanover"],
+    "Braunschweig": ["Brunswick"],
+    "Frankfurt am Main": ["Frankfurt/Main", "Frankfurt a. M."],
+    "Frankfurt (Oder)": ["Frankfurt an der Oder"],
+    "Freiburg im Breisgau": ["Freiburg"],
+    "Garching b. München": ["Garching bei München", "Garching"],
+    "Kempten (Allgäu)": ["Kempten"],
+}
+
+
+def location_keys(name: str):
+    """Ключи алиасов места: свёрнутое имя с умлаутами как ae/oe/ue и как a/o/u, плюс синонимы."""
+    keys = []
+    for spelling in [name, *LOCATION_ALIASES.get(name, [])]:
+        for expand_umlauts in (True, False):
+            key = fold_text(spelling, expand_umlauts)
+            if key and key not in keys:
+                keys.append(key)
+    return keys
+
+
+def query_keys(value: str):
+    """Ключи для поиска по алиасам: "München", "Muenchen" и "Munchen" находят одно место."""
+    return {key for key in (fold_text(value), fold_text(value, expand_umlauts=False)) if key}
+
+
+def match_location_ids(aliases, value: str):
+    """id мест, в алиасах которых встречается value (как прежний ilike('%value%'), но без учёта написания).
+    aliases — пары (алиас, location_id), например из load_location_aliases."""
+    keys = query_keys(value)
+    return {location_id for alias, location_id in aliases if any(key in alias for key in keys)}
+
+
+def load_location_aliases(db: Session):
+    return db.query(LocationAlias.alias, LocationAlias.location_id).all()
+
+
+def resolve_location_ids(db: Session, values):
+    """id мест для значений фильтра location. Подстрока ищется только в маленьком
+    справочнике алиасов, сами программы затем выбираются по индексу location_id."""
+    conditions = [LocationAlias.alias.contains(key, autoescape=True) for value in values for key in query_keys(value)]
+    if not conditions:
+        return set()
+    return {location_id for (location_id,) in db.query(LocationAlias.location_id).filter(or_(*conditions)).distinct()}
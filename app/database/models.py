@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String
 from app.database.database import Base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Table, Date
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Table, Date, DateTime
 from sqlalchemy.orm import relationship
 
 
@@ -10,7 +10,21 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
-    refresh_token = Column(String, nullable=True)  # Добавляем поле
+
+
+class RefreshToken(Base):
+    """Выданный refresh-токен. Хранится только sha256 от его jti, сам JWT — нет.
+
+    Токены одного входа образуют семейство (family_id): при refresh старый токен
+    отзывается и выдаётся новый в том же семействе. Повторное предъявление
+    отозванного токена означает утечку — отзывается всё семейство.
+    """
+    __tablename__ = "refresh_tokens"
+    jti_hash = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    family_id = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked = Column(Boolean, nullable=False, default=False)
 
 
 from sqlalchemy import Column, Integer, String, ForeignKey, Table
@@ -21,7 +35,7 @@ from app.database.database import Base
 program_requirements = Table(
     "program_requirements", Base.metadata,
     Column("program_id", Integer, ForeignKey("programs.id"), primary_key=True),
-    Column("requirement_id", Integer, ForeignKey("requirements.id"), primary_key=True),
+    Column("requirement_id", Integer, ForeignKey("requirements.id"), primary_key=True, index=True),
     Column("min_score", String, nullable=True),  # Из Float в String
     Column("is_mandatory", String, nullable=True)  # Из Boolean в String
 )
@@ -29,13 +43,13 @@ program_requirements = Table(
 program_fields = Table(
     "program_fields", Base.metadata,
     Column("program_id", Integer, ForeignKey("programs.id"), primary_key=True),
-    Column("field_id", Integer, ForeignKey("fields_of_study.id"), primary_key=True)
+    Column("field_id", Integer, ForeignKey("fields_of_study.id"), primary_key=True, index=True)
 )
 
 program_subjects = Table(
     "program_subjects", Base.metadata,
     Column("program_id", Integer, ForeignKey("programs.id"), primary_key=True),
-    Column("subject_id", Integer, ForeignKey("subjects.id"), primary_key=True)
+    Column("subject_id", Integer, ForeignKey("subjects.id"), primary_key=True, index=True)
 )
 
 fields_subjects = Table(
@@ -48,7 +62,7 @@ fields_subjects = Table(
 class University(Base):
     __tablename__ = "universities"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=True)
+    name = Column(String, nullable=True, index=True)
     location = Column(String, nullable=True)
     
     programs = relationship("Program", back_populates="university")
@@ -57,10 +71,16 @@ class Program(Base):
     __tablename__ = "programs"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=True)
-    university_id = Column(Integer, ForeignKey("universities.id"), nullable=True)
-    location = Column(String, nullable=True)
+    university_id = Column(Integer, ForeignKey("universities.id"), nullable=True, index=True)
+    location = Column(String, nullable=True, index=True)  # Каноническое написание из locations
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True, index=True)
     duration = Column(String, nullable=True)
     tuition_fees = Column(String, nullable=True)
+    # Разобранные при импорте значения (исходные строки выше остаются для отображения)
+    duration_months = Column(Integer, nullable=True, index=True)  # Самый короткий вариант
+    tuition_amount = Column(Float, nullable=True, index=True)  # За семестр; 0 — без платы, NULL — неизвестно
+    tuition_currency = Column(String, nullable=True)
+    tuition_period = Column(String, nullable=True)  # semester / year / month / total — как указано в тексте
     language = Column(String, nullable=True)
     mode_of_study = Column(String, nullable=True)
     uni_assist = Column(String, nullable=True)  # Из Boolean в String
@@ -74,18 +94,37 @@ class Program(Base):
     fields_of_study = relationship("FieldOfStudy", secondary=program_fields, back_populates="programs")
     subjects = relationship("Subject", secondary=program_subjects, back_populates="programs")
 
+class Location(Base):
+    """Место обучения. name — каноническое написание (первое встреченное при импорте)."""
+    __tablename__ = "locations"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True)
+
+    aliases = relationship("LocationAlias", back_populates="location")
+
+class LocationAlias(Base):
+    """Свёрнутое написание места (см. fold_text): варианты с умлаутами и без, синонимы из LOCATION_ALIASES."""
+    __tablename__ = "location_aliases"
+    alias = Column(String, primary_key=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False, index=True)
+
+    location = relationship("Location", back_populates="aliases")
+
 class Requirement(Base):
     __tablename__ = "requirements"
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String, nullable=True)
     detail = Column(String, nullable=True)
+    kind = Column(String, nullable=True, index=True)  # GPA, GRE, IELTS, TOEFL, ...
+    min_score = Column(Float, nullable=True, index=True)  # Минимальный балл из detail
+    is_mandatory = Column(Boolean, nullable=False, default=True)  # False для "recommended" и т. п.
     
     programs = relationship("Program", secondary=program_requirements, back_populates="requirements")
 
 class FieldOfStudy(Base):
     __tablename__ = "fields_of_study"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=True)
+    name = Column(String, nullable=True, index=True)
     
     programs = relationship("Program", secondary=program_fields, back_populates="fields_of_study")
     subjects = relationship("Subject", secondary=fields_subjects, back_populates="fields_of_study")
@@ -93,8 +132,30 @@ class FieldOfStudy(Base):
 class Subject(Base):
     __tablename__ = "subjects"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=True)
+    name = Column(String, nullable=True, index=True)
     
     programs = relationship("Program", secondary=program_subjects, back_populates="subjects")
     fields_of_study = relationship("FieldOfStudy", secondary=fields_subjects, back_populates="subjects")
 
+
+class ImportManifest(Base):
+    """Какой JSON-файл импортирован, с каким хэшем и какую программу он дал."""
+    __tablename__ = "import_manifest"
+    path = Column(String, primary_key=True)  # Имя файла относительно DATA_DIR
+    content_hash = Column(String, nullable=False)  # sha256 содержимого
+    program_id = Column(Integer, ForeignKey("programs.id"), nullable=True, index=True)
+    mtime = Column(Float, nullable=True)  # Для быстрой проверки без чтения файла
+    size = Column(Integer, nullable=True)
+
+
+class CatalogMeta(Base):
+    """Служебные значения каталога, например номер поколения данных (generation)."""
+    __tablename__ = "catalog_meta"
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+# Таблицы пользователей живут в основной БД, всё остальное — каталог,
+# который можно собрать заранее в read-only снимок
+USER_TABLES = [User.__table__, RefreshToken.__table__]
+CATALOG_TABLES = [table for table in Base.metadata.sorted_tables if table not in USER_TABLES]
@@ -0,0 +1,68 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from app.config import SLOW_QUERY_MS
+from app.services.metrics import sql_slow_queries_total
+
+logger = logging.getLogger(__name__)
+
+# Счётчик SQL-запросов текущего запроса (или блока count_queries)
+_current_counter = ContextVar("sql_query_counter", default=None)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # Суммарное время выполнения запросов, в секундах
+
+
+@contextmanager
+def count_queries():
+    """Считает SQL-запросы и их время внутри блока: `with count_queries() as counter: ...`"""
+    counter = QueryCounter()
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.count += 1
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.duration += elapsed
+    if SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+        sql_slow_queries_total.inc()
+        logger.warning("Медленный SQL-запрос", extra={"fields": {
+            "duration_ms": round(elapsed * 1000, 2),
+            "statement": " ".join(statement.split())[:500],
+            "executemany": executemany,
+        }})
+
+
+def _handle_error(exception_context):
+    # Запрос упал — снимаем его отметку времени, чтобы стек не рос
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def install_query_counter(engine):
+    """Подписывает счётчик и лог медленных запросов на все запросы engine."""
+    for name, listener in (
+        ("before_cursor_execute", _before_cursor_execute),
+        ("after_cursor_execute", _after_cursor_execute),
+        ("handle_error", _handle_error),
+    ):
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
@@ -0,0 +1,50 @@
+import json
+import logging
+from datetime import datetime, timezone
+from app.config import LOG_LEVEL, LOG_FORMAT
+
+# Структурированные поля события передаются через extra:
+#     logger.info("Импорт программ завершён", extra={"fields": {"changed": 3, "timings": {...}}})
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на событие: время, уровень, логгер, сообщение и поля."""
+
+    def format(self, record):
+        event = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            event["exception"] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Человекочитаемый формат: поля события дописываются как key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={json.dumps(value, ensure_ascii=False, default=str)}" for key, value in fields.items())
+        return line
+
+
+def setup_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT):
+    """Настраивает корневой логгер приложения (повторный вызов заменяет обработчик)."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if getattr(existing, "app_handler", False):
+            root.removeHandler(existing)
+    handler.app_handler = True
+    root.addHandler(handler)
+    root.setLevel(level.upper())
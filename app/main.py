@@ -1,11 +1,35 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware  # Импортируем CORS Middleware
 from app.routes import users, items
 from app.database.database import engine, Base
 import app.database.models  # Импортируем, чтобы SQLAlchemy знал о таблицах
+from app.database.models import USER_TABLES
 from app.database.import_data.start_import import start_import
+from app.services.program_index import rebuild_program_index
+from app.services.autocomplete import rebuild_autocomplete_index
+from app.config import USE_PROGRAM_INDEX, CATALOG_SNAPSHOT, CATALOG_WATCH_INTERVAL
+from app.database.query_counter import count_queries
+from app.database.generation import refresh_data_generation
+from app.services.password_pool import start_password_pool, shutdown_password_pool
+from app.services.token_store import token_flush_loop, flush_token_writes
+from app.services.metrics import http_requests_total, http_request_duration, http_request_sql_queries, http_request_sql_duration
+from app.routes import metrics, autocomplete, admin
+from app.services.catalog_reload import catalog_watch_loop
+from app.services.admission import AdmissionMiddleware
+from app.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Hackathon-2025 API")
 
+# Лимиты одновременности и скорости для дорогих маршрутов (см. app/services/admission.py).
+# Добавлен первым — внутри CORS, чтобы отказы 429/503 тоже получали CORS-заголовки
+app.add_middleware(AdmissionMiddleware)
+
 # Разрешаем CORS для всех источников (*), методов и заголовков
 app.add_middleware(
     CORSMiddleware,
@@ -14,15 +38,77 @@ app.add_middleware(
     allow_methods=["*"],  # Разрешаем все методы (GET, POST, PUT, DELETE и т. д.)
     allow_headers=["*"],  # Разрешаем все заголовки
 )
-print(f"📌 Используемая БД: {engine.url}")
 
-Base.metadata.create_all(bind=engine)
 
-start_import()
+# Время запроса, число и время SQL-запросов — в метрики /metrics и в заголовки ответа
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        with count_queries() as counter:
+            response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        # Шаблон пути маршрута (/programs/filter), а не сам URL — чтобы не плодить серии
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else request.scope.get("admission_route", "unmatched")
+        labels = (request.method, route_path)
+        http_requests_total.inc(*labels, status)
+        http_request_duration.observe(elapsed, *labels)
+        http_request_sql_queries.observe(counter.count, *labels)
+        http_request_sql_duration.observe(counter.duration, *labels)
+
+    response.headers["X-SQL-Query-Count"] = str(counter.count)
+    response.headers["Server-Timing"] = f"sql;dur={counter.duration * 1000:.2f}, app;dur={elapsed * 1000:.2f}"
+    return response
+
+logger.info("Используемая БД", extra={"fields": {"url": str(engine.url)}})
+
+if CATALOG_SNAPSHOT:
+    # Каталог уже собран заранее: создаём только таблицы пользователей и не импортируем
+    logger.info("Каталог: read-only снимок", extra={"fields": {"path": CATALOG_SNAPSHOT}})
+    Base.metadata.create_all(bind=engine, tables=USER_TABLES)
+else:
+    Base.metadata.create_all(bind=engine)
+    start_import()
+
+# Поколение данных — для инвалидации кэшей и ETag
+refresh_data_generation()
+
+# Строим in-memory индекс для /programs/filter
+if USE_PROGRAM_INDEX:
+    rebuild_program_index()
+
+# Префиксный индекс для /autocomplete
+rebuild_autocomplete_index()
+
+# Пул bcrypt, фоновая запись refresh-токенов пачками и (если включено) слежение за каталогом JSON-файлов
+@app.on_event("startup")
+async def start_token_flush():
+    start_password_pool()
+    app.state.token_flush_task = asyncio.create_task(token_flush_loop())
+    app.state.catalog_watch_task = None
+    if CATALOG_WATCH_INTERVAL > 0:
+        app.state.catalog_watch_task = asyncio.create_task(catalog_watch_loop())
+
+
+# Останавливаем процессы пула bcrypt и дописываем очередь токенов вместе с сервером
+@app.on_event("shutdown")
+async def stop_background_workers():
+    app.state.token_flush_task.cancel()
+    if app.state.catalog_watch_task is not None:
+        app.state.catalog_watch_task.cancel()
+    await flush_token_writes()
+    shutdown_password_pool()
 
 # Подключаем маршруты
 app.include_router(users.router)
 app.include_router(items.router)
+app.include_router(metrics.router)
+app.include_router(autocomplete.router)
+app.include_router(admin.router)
 
 @app.get("/")
 def home():
@@ -0,0 +1,29 @@
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse
+from app.config import ADMIN_TOKEN
+from app.services.catalog_reload import start_reload, reload_status
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/catalog/reload", summary="Перезагрузить каталог из JSON-файлов без рестарта", status_code=202)
+async def reload_catalog():
+    # 202 — перезагрузка запущена; 409 — предыдущая ещё идёт (в ответе её состояние)
+    if not start_reload("admin"):
+        return JSONResponse(reload_status(), status_code=409)
+    return reload_status()
+
+
+@router.get("/catalog/reload", summary="Состояние последней перезагрузки каталога")
+async def catalog_reload_status():
+    return reload_status()
@@ -0,0 +1,20 @@
+from typing import List, Optional
+from fastapi import APIRouter, Query, HTTPException
+from app.services.autocomplete import get_autocomplete_index, KINDS
+
+router = APIRouter()
+
+
+@router.get("/autocomplete", summary="Подсказки по названиям программ, университетам, направлениям, предметам и городам")
+async def autocomplete(
+    q: str = Query(..., min_length=1, description="Начало слова; регистр и диакритика не важны"),
+    kind: Optional[List[str]] = Query(None, description=f"Виды подсказок: {', '.join(KINDS)} (по умолчанию все)"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    unknown = set(kind or ()) - set(KINDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kind: {', '.join(sorted(unknown))}")
+    autocomplete_index = get_autocomplete_index()
+    if autocomplete_index is None:
+        raise HTTPException(status_code=503, detail="Autocomplete index is not ready")
+    return autocomplete_index.suggest(q, limit, set(kind) if kind else None)
@@ -1,113 +1,187 @@
-import re
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends
-from sqlalchemy import or_
-from app.database.database import get_db
-from app.database.models import Program, FieldOfStudy, Subject, Requirement, program_requirements
+from itertools import islice, chain
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Query, Header, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse, JSONResponse
+from app.database.database import get_async_read_db, ReadSessionLocal
+from app.database.fts import search_program_ids
+from app.services.item_service import iter_programs_sql, search_programs_sql, facet_counts_sql, encode_program
+from app.schemas import ProgramOut
+from app.services.program_index import get_program_index, get_or_build_program_index
+from app.services.filter_cache import filter_cache, facets_cache, cache_key, make_etag, etag_matches
+from app.database.generation import get_data_generation
+from app.services.batch_filter import iter_batch_results
+from app.services.recommendations import recommend
+from app.config import BATCH_FILTER_MAX_PROFILES
 
 router = APIRouter()
 
-def extract_number_from_string(text: str):
-    """Извлекает числовое значение (GPA, GRE, IELTS и т. д.) из строки."""
-    if not text:
-        return None
-    numbers = re.findall(r"\d+\.?\d*", text)
-    return float(numbers[0]) if numbers else None
-
-@router.post("/programs/filter", summary="Фильтрация программ по JSON-фильтру")
-def filter_programs(filters: dict, db: Session = Depends(get_db)):
-    query = db.query(Program)
-
-    # 1️⃣ Фильтр по `location`
-    user_locations = filters.get("course_details", {}).get("location", [])
-    if user_locations:
-        query = query.filter(
-            or_(*[Program.location.ilike(f"%{loc}%") for loc in user_locations])
-        )
 
-    # 2️⃣ Фильтр по `field_of_study` и `subject`
-    if filters.get("field_of_study"):
-        query = query.join(Program.fields_of_study).filter(FieldOfStudy.name.ilike(f"%{filters['field_of_study']}%"))
-    if filters.get("subject"):
-        query = query.join(Program.subjects).filter(Subject.name.in_(filters["subject"]))
-
-    # Получаем предварительный список программ
-    programs = query.all()
-
-    # 3️⃣ Фильтруем по `requirements`
-    filtered_programs = []
-    user_gpa = extract_number_from_string(filters["requirements"].get("GPA"))  # GPA пользователя
-    user_gre = extract_number_from_string(filters["requirements"].get("GRE"))  # GRE пользователя
-    user_language_requirements = filters["requirements"].get("language_requirements", {})
-
-    for program in programs:
-        # 4️⃣ Получаем `requirements` этой программы
-        program_requirements_list = (
-            db.query(Requirement)
-            .join(program_requirements, program_requirements.c.requirement_id == Requirement.id)
-            .filter(program_requirements.c.program_id == program.id)
-            .all()
+class JSONFragmentsResponse(Response):
+    """JSON-массив из готовых фрагментов (см. encode_program): тело только склеивается, без кодирования.
+    Готовое тело (bytes, например из кэша) отдаётся как есть."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return b"[" + b",".join(content) + b"]"
+
+
+def encode_rows(rows):
+    """(id, фрагмент) для строк из SQL-ветки."""
+    for row in rows:
+        yield row["id"], encode_program(row)
+
+
+def stream_programs_sql(filters: dict, sort: str, cursor: Optional[int], limit: Optional[int]):
+    db = ReadSessionLocal()
+    try:
+        yield from iter_programs_sql(db, filters, sort, cursor, limit)
+    finally:
+        db.close()
+
+
+@router.post(
+    "/programs/filter",
+    summary="Фильтрация программ по JSON-фильтру",
+    response_model=List[ProgramOut],
+    response_class=JSONFragmentsResponse,
+)
+async def filter_programs(
+    filters: dict,
+    sort: str = Query("id", pattern="^(id|name|deadline|tuition)$", description="Поле сортировки"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Размер страницы (без него — все программы)"),
+    cursor: Optional[int] = Query(None, description="id последней программы предыдущей страницы"),
+    stream: bool = Query(False, description="Отдавать NDJSON построчно по мере фильтрации"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    # Обычные (не потоковые) ответы кэшируются по каноническому ключу и поколению данных
+    if not stream:
+        key = cache_key({"filters": filters, "sort": sort, "limit": limit, "cursor": cursor})
+        generation = get_data_generation()
+        etag = make_etag(key, generation)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        cached = filter_cache.get(key, generation)
+        if cached is not None:
+            body, headers = cached
+            return JSONFragmentsResponse(body, headers={**headers, "ETag": etag, "X-Cache": "HIT"})
+
+    # Отвечаем из in-memory индекса (готовые JSON-фрагменты), если он построен, иначе — через SQL.
+    # Дальше обе ветки работают с парами (id, фрагмент)
+    program_index = get_program_index()
+    if program_index is not None:
+        program_ids = await db.run_sync(search_program_ids, filters["q"]) if filters.get("q") else None
+        fragments = program_index.iter_fragments(program_index.match_mask(filters, program_ids), sort, cursor)
+    elif stream:
+        # Поток читает БД в пуле потоков Starlette своей синхронной сессией
+        fragments = encode_rows(stream_programs_sql(filters, sort, cursor, limit))
+    else:
+        sql_limit = None if limit is None else limit + 1
+        rows = await db.run_sync(lambda session: list(iter_programs_sql(session, filters, sort, cursor, sql_limit)))
+        fragments = encode_rows(rows)
+
+    if stream:
+        # Первую строку получаем сразу, чтобы ошибки (например, неизвестный cursor) стали 400, а не обрывом потока.
+        # id последней строки — курсор следующей страницы
+        fragments = fragments if limit is None else islice(fragments, limit)
+        first = await run_in_threadpool(next, fragments, None)
+        fragments = chain([first], fragments) if first is not None else iter(())
+        return StreamingResponse(
+            (fragment + b"\n" for _, fragment in fragments),
+            media_type="application/x-ndjson",
         )
 
-        # ✅ Если у программы нет требований → она всегда подходит
-        if not program_requirements_list:
-            filtered_programs.append(program)
-            continue
-
-        is_valid = True
-
-        # 🔥 5️⃣ Фильтр по `GPA`
-        program_gpa = next((extract_number_from_string(req.detail) for req in program_requirements_list if "GPA" in req.detail), None)
-        if program_gpa is not None and user_gpa is not None and user_gpa < program_gpa:
-            is_valid = False
-
-        # 🔥 6️⃣ Фильтр по `GRE`
-        program_gre = None
-        gre_required = False
-
-        for req in program_requirements_list:
-            if "GRE" in req.detail:
-                if "recommended" in req.detail.lower():
-                    gre_required = False
-                else:
-                    program_gre = extract_number_from_string(req.detail)
-                    gre_required = True
-
-        if program_gre is not None and (user_gre is None or user_gre < program_gre):
-            is_valid = False
-        if gre_required and user_gre is None:
-            is_valid = False
-
-        # 🔥 7️⃣ Фильтр по IELTS, TOEFL и другим тестам
-        for lang, user_tests in user_language_requirements.items():
-            if not isinstance(user_tests, dict):
-                continue
-            for test_name, user_score in user_tests.items():
-                if user_score:
-                    for req in program_requirements_list:
-                        if test_name in req.detail:
-                            extracted_score = extract_number_from_string(req.detail)
-                            if extracted_score is not None and float(user_score) < extracted_score:
-                                is_valid = False
-                                break
-
-        if is_valid:
-            filtered_programs.append(program)
-
-    # 8️⃣ Возвращаем отфильтрованные программы
-    return [
-        {
-            "id": program.id,
-            "name": program.name,
-            "university": program.university.name if program.university else None,
-            "location": program.location,
-            "duration": program.duration,
-            "tuition_fees": program.tuition_fees,
-            "language": program.language,
-            "mode_of_study": program.mode_of_study,
-            "uni_assist": program.uni_assist,
-            "application_deadline": program.application_deadline,
-            "link": program.link
-        }
-        for program in filtered_programs
-    ]
+    headers = {}
+    if limit is None:
+        page = list(fragments)
+    else:
+        # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+        page = list(islice(fragments, limit + 1))
+        if len(page) > limit:
+            page = page[:limit]
+            headers["X-Next-Cursor"] = str(page[-1][0])
+
+    # Поколение сменилось, пока ответ считался, — неизвестно, по какому каталогу он собран: без ETag
+    validators = {"ETag": etag} if get_data_generation() == generation else {}
+    response = JSONFragmentsResponse([fragment for _, fragment in page], headers={**headers, **validators, "X-Cache": "MISS"})
+    filter_cache.set(key, (response.body, headers), generation)
+    return response
+
+
+@router.post("/programs/filter/batch", summary="Пакетная фильтрация: JSONL с профилями на входе, JSONL с результатами на выходе")
+async def filter_programs_batch(
+    request: Request,
+    sort: str = Query("id", pattern="^(id|name|deadline|tuition)$", description="Поле сортировки"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Сколько программ отдавать на профиль"),
+    include_programs: bool = Query(False, description="Отдавать программы целиком, а не только id"),
+):
+    # Тело — строки JSON, по фильтру /programs/filter на строку (плюс необязательный "profile_id")
+    lines = (await request.body()).splitlines()
+    profiles = sum(1 for line in lines if line.strip())
+    if profiles > BATCH_FILTER_MAX_PROFILES:
+        raise HTTPException(status_code=413, detail=f"Too many profiles: {profiles} > {BATCH_FILTER_MAX_PROFILES}")
+    # Синхронный генератор Starlette выполняет в пуле потоков, результаты уходят по мере готовности
+    return StreamingResponse(iter_batch_results(lines, sort, limit, include_programs), media_type="application/x-ndjson")
+
+
+@router.post("/programs/recommend", summary="Top-k программ, ранжированных по качеству совпадения с профилем")
+async def recommend_programs(
+    filters: dict,
+    k: int = Query(10, ge=1, le=100, description="Сколько программ вернуть"),
+    explain: bool = Query(False, description="Добавить баллы по каждому критерию"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    # Пороги, язык, форма обучения и q — жёсткие условия; location, field_of_study и subject — пожелания
+    program_ids = await db.run_sync(search_program_ids, filters["q"]) if filters.get("q") else None
+    program_index = await db.run_sync(get_or_build_program_index)
+    results, recommender = recommend(program_index, filters, k, explain, program_ids)
+    return JSONResponse(results, headers={
+        "X-Candidates": str(recommender.candidates),
+        "X-Scored": str(recommender.scored),
+    })
+
+
+@router.post("/programs/facets", summary="Значения фасетов и число подходящих программ для каждого")
+async def program_facets(filters: dict, db: AsyncSession = Depends(get_async_read_db)):
+    # Фасеты зависят только от фильтра и данных — кэшируем в пределах поколения данных
+    key = cache_key(filters)
+    generation = get_data_generation()
+    facets = facets_cache.get(key, generation)
+    if facets is None:
+        program_index = get_program_index()
+        if program_index is not None:
+            program_ids = await db.run_sync(search_program_ids, filters["q"]) if filters.get("q") else None
+            facets = program_index.facet_counts(program_index.match_mask(filters, program_ids))
+        else:
+            facets = await db.run_sync(facet_counts_sql, filters)
+        facets_cache.set(key, facets, generation)
+    return facets
+
+
+@router.get("/programs/filter/cache", summary="Статистика кэша /programs/filter")
+async def filter_cache_stats():
+    return {**filter_cache.stats(), "facets": facets_cache.stats()}
+
+
+@router.get(
+    "/programs/search",
+    summary="Полнотекстовый поиск программ (BM25)",
+    response_model=List[ProgramOut],
+    response_class=JSONFragmentsResponse,
+)
+async def search_programs(
+    q: str = Query(..., min_length=1, description="Текст: название, университет, город, направление, предмет"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    program_ids = await db.run_sync(search_program_ids, q, limit)
+    program_index = get_program_index()
+    if program_index is not None:
+        return JSONFragmentsResponse(program_index.fragments_for_ids(program_ids))
+    rows = await db.run_sync(search_programs_sql, program_ids)
+    return JSONFragmentsResponse([encode_program(row) for row in rows])
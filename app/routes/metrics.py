@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.services.metrics import REGISTRY, Gauge, admission_state
+from app.services.filter_cache import filter_cache, facets_cache
+from app.services.password_pool import password_pool_stats
+from app.services.admission import admission_stats
+
+router = APIRouter(tags=["Metrics"])
+
+cache_entries = REGISTRY.register(Gauge("cache_entries", "Число записей в кэше ответов", ("cache",)))
+cache_requests = REGISTRY.register(Gauge("cache_requests", "Обращения к кэшу ответов с момента старта", ("cache", "result")))
+password_pool = REGISTRY.register(Gauge("password_pool", "Состояние пула bcrypt", ("state",)))
+
+
+def collect_service_stats():
+    for name, cache in (("filter", filter_cache), ("facets", facets_cache)):
+        stats = cache.stats()
+        cache_entries.set(stats["size"], name)
+        cache_requests.set(stats["hits"], name, "hit")
+        cache_requests.set(stats["misses"], name, "miss")
+    for state, value in password_pool_stats().items():
+        password_pool.set(value, state)
+    for stats in admission_stats():
+        admission_state.set(stats["active"], stats["limiter"], "active")
+        admission_state.set(stats["queued"], stats["limiter"], "queued")
+
+
+REGISTRY.add_collector(collect_service_stats)
+
+
+@router.get("/metrics", summary="Метрики в текстовом формате Prometheus")
+async def prometheus_metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,25 +1,25 @@
 from fastapi import Request
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
-from app.database.database import get_db
+from app.database.database import get_async_db
 from app.services.user_service import create_user, authenticate_user, generate_tokens
+from app.services.token_store import rotate_refresh_token
 from app.schemas import UserCreate, Token
 import jwt
-from app.database.models import User
 from app.config import SECRET_KEY, ALGORITHM
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
 
 @router.post("/register", response_model=Token)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Создаем пользователя
-    db_user = create_user(db, user_data)
+    db_user = await create_user(db, user_data)
     
     # Генерируем токены для нового пользователя
-    access_token, refresh_token = generate_tokens(db_user, db)
+    access_token, refresh_token = await generate_tokens(db_user.id, db_user.username)
     
     return {
         "access_token": access_token,
@@ -29,12 +29,12 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/token", response_model=Token)
-def login(user_data: UserCreate, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user_data.username, user_data.password)
+async def login(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, user_data.username, user_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    access_token, refresh_token = generate_tokens(user, db)
+    access_token, refresh_token = await generate_tokens(user.id, user.username)
 
     return {
         "access_token": access_token,
@@ -70,16 +70,15 @@ def login(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh")
-def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
+async def refresh_token(refresh_token: str):
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
 
-        user = db.query(User).filter(User.id == user_id, User.refresh_token == refresh_token).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        # Проверка по хэшу jti (кэш или первичный ключ), старый токен отзывается
+        family_id = await rotate_refresh_token(payload.get("jti"), user_id)
 
-        access_token, new_refresh_token = generate_tokens(user, db)
+        access_token, new_refresh_token = await generate_tokens(user_id, payload.get("sub"), family_id)
 
         return {
             "access_token": access_token,
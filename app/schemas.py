@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 # Схема для регистрации пользователя
@@ -21,3 +22,21 @@ class UserResponse(BaseModel):
 
     class Config:
         from_attributes = True  # Для работы с SQLAlchemy
+
+
+# Схема программы в ответах /programs/* (см. serialize_program)
+class ProgramOut(BaseModel):
+    id: int
+    name: Optional[str]
+    university: Optional[str]
+    location: Optional[str]
+    duration: Optional[str]
+    duration_months: Optional[int]
+    tuition_fees: Optional[str]
+    tuition_amount: Optional[float]  # За семестр
+    tuition_currency: Optional[str]
+    language: Optional[str]
+    mode_of_study: Optional[str]
+    uni_assist: Optional[str]
+    application_deadline: Optional[str]
+    link: Optional[str]
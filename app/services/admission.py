@@ -0,0 +1,186 @@
+"""Контроль допуска к дорогим маршрутам.
+
+Для каждого маршрута из ROUTE_POLICIES действуют два ограничения:
+
+* token bucket на клиента — сверх своей скорости клиент сразу получает 429;
+* лимит одновременных запросов с ограниченной очередью — лишние запросы ждут
+  не дольше ADMISSION_QUEUE_TIMEOUT, а при полной очереди сразу получают 503.
+
+Так под всплеском задержка допущенных запросов остаётся ограниченной, вместо
+того чтобы все запросы копились в пуле потоков и деградировали одновременно.
+Всё состояние в памяти процесса и меняется только в event loop.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+import jwt
+from fastapi.responses import JSONResponse
+from app.config import (
+    SECRET_KEY, ALGORITHM, ADMISSION_QUEUE_TIMEOUT, RATE_LIMIT_MAX_CLIENTS,
+    FILTER_CONCURRENCY, FILTER_QUEUE_LIMIT, FILTER_RATE, FILTER_BURST,
+    SEARCH_CONCURRENCY, SEARCH_QUEUE_LIMIT, SEARCH_RATE, SEARCH_BURST,
+    LOGIN_CONCURRENCY, LOGIN_QUEUE_LIMIT, LOGIN_RATE, LOGIN_BURST, REGISTER_RATE, REGISTER_BURST,
+)
+from app.services.metrics import admission_rejected_total, admission_wait_seconds
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """Не больше max_concurrent запросов в обработке и max_queue в очереди (FIFO)."""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters = deque()
+
+    def reject(self, reason: str):
+        admission_rejected_total.inc(self.name, reason)
+        raise AdmissionRejected(503, "Server is overloaded, try again later", 1)
+
+    async def acquire(self):
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+            admission_wait_seconds.observe(0.0, self.name)
+            return
+        if len(self.waiters) >= self.max_queue:
+            self.reject("queue_full")
+
+        # Освободившийся слот передаётся первому ждущему через его future (active при этом не меняется)
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.reject("timeout")
+        except asyncio.CancelledError:
+            # Клиент ушёл, но слот уже был передан — возвращаем его
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if future in self.waiters:
+                self.waiters.remove(future)
+            admission_wait_seconds.observe(time.perf_counter() - started, self.name)
+
+    def release(self):
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class RateLimiter:
+    """Token bucket на клиента: rate запросов в секунду, всплеск до burst.
+    Хранится не больше max_clients корзин — давно не приходившие клиенты вытесняются."""
+
+    def __init__(self, name: str, rate: float, burst: int, max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()  # клиент -> (токены, время обновления)
+
+    def check(self, client: str):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[client] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+        if not allowed:
+            admission_rejected_total.inc(self.name, "rate_limited")
+            raise AdmissionRejected(429, "Too many requests", (1 - tokens) / self.rate)
+
+
+filter_admission = ConcurrencyLimiter("filter", FILTER_CONCURRENCY, FILTER_QUEUE_LIMIT, ADMISSION_QUEUE_TIMEOUT)
+search_admission = ConcurrencyLimiter("search", SEARCH_CONCURRENCY, SEARCH_QUEUE_LIMIT, ADMISSION_QUEUE_TIMEOUT)
+login_admission = ConcurrencyLimiter("login", LOGIN_CONCURRENCY, LOGIN_QUEUE_LIMIT, ADMISSION_QUEUE_TIMEOUT)
+filter_rate = RateLimiter("filter", FILTER_RATE, FILTER_BURST)
+search_rate = RateLimiter("search", SEARCH_RATE, SEARCH_BURST)
+login_rate = RateLimiter("login", LOGIN_RATE, LOGIN_BURST)
+register_rate = RateLimiter("register", REGISTER_RATE, REGISTER_BURST)
+
+# (метод, путь) -> (ограничение скорости, ограничение одновременности).
+# Полнотекстовый поиск и фасеты — отдельный класс: их всплеск не занимает слоты фильтрации.
+# Регистрация делит с входом пул bcrypt (login_admission), но не корзину скорости
+ROUTE_POLICIES = {
+    ("POST", "/programs/filter"): (filter_rate, filter_admission),
+    ("POST", "/programs/filter/batch"): (filter_rate, filter_admission),
+    ("POST", "/programs/recommend"): (filter_rate, filter_admission),
+    ("POST", "/programs/facets"): (search_rate, search_admission),
+    ("GET", "/programs/search"): (search_rate, search_admission),
+    ("POST", "/users/token"): (login_rate, login_admission),
+    ("POST", "/users/register"): (register_rate, login_admission),
+}
+
+
+def client_key(scope) -> str:
+    """Пользователь из действительного Bearer-токена, иначе IP клиента."""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return f"user:{jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])['user_id']}"
+                except (jwt.PyJWTError, KeyError):
+                    pass
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def admission_stats():
+    return [
+        {"limiter": limiter.name, "active": limiter.active, "queued": len(limiter.waiters)}
+        for limiter in (filter_admission, search_admission, login_admission)
+    ]
+
+
+class AdmissionMiddleware:
+    """ASGI-middleware: слот занят, пока ответ не отправлен целиком (включая потоковые)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        policy = ROUTE_POLICIES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Шаблон пути для метрик запросов: отклонённые запросы не доходят до роутера
+        scope["admission_route"] = scope["path"]
+        rate_limiter, limiter = policy
+        try:
+            rate_limiter.check(client_key(scope))
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": e.detail}, status_code=e.status_code,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
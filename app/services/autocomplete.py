@@ -0,0 +1,137 @@
+import logging
+import time
+from bisect import bisect_left
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database.database import ReadSessionLocal
+from app.database.models import Program, University, FieldOfStudy, Subject, Location, program_fields, program_subjects
+from app.utils import fold_text
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("program", "university", "field", "subject", "location")
+# Под короткие префиксы ("a", "ma") подходит большая часть ключей — их ранжирование кэшируется
+SHORT_PREFIX_LENGTH = 2
+
+
+def suggestion_keys(value: str):
+    """Ключи значения: свёрнутый текст с каждого слова ("Computer Science" ищется и по "sci"),
+    с умлаутами как ae/oe/ue и как a/o/u."""
+    keys = set()
+    for expand_umlauts in (True, False):
+        words = fold_text(value, expand_umlauts).split()
+        for start in range(len(words)):
+            keys.add((" ".join(words[start:]), start))
+    return keys
+
+
+class AutocompleteIndex:
+    """Префиксный индекс подсказок: отсортированный массив ключей и bisect.
+
+    Все ключи с префиксом q лежат в массиве подряд, начиная с bisect_left(keys, q).
+    Подсказки ранжируются по числу программ, затем совпадение с начала значения
+    выше совпадения с середины, затем по алфавиту.
+    """
+
+    def __init__(self, entries):
+        # entries: (kind, значение, число программ)
+        self.entries = []
+        pairs = []
+        for kind, value, count in entries:
+            if not value:
+                continue
+            entry_id = len(self.entries)
+            self.entries.append({"value": value, "kind": kind, "count": count})
+            pairs.extend((key, start, entry_id) for key, start in suggestion_keys(value))
+        pairs.sort()
+        self.keys = [key for key, _, _ in pairs]
+        self.matches = [(start, entry_id) for _, start, entry_id in pairs]
+        self.short_prefixes = {}  # префиксы -> ранжированные entry_id (индекс неизменяем, кэш не устаревает)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def suggest(self, q: str, limit: int = 10, kinds=None):
+        prefixes = frozenset(prefix for prefix in (fold_text(q), fold_text(q, expand_umlauts=False)) if prefix)
+        if max(map(len, prefixes), default=0) <= SHORT_PREFIX_LENGTH:
+            ranked = self.short_prefixes.get(prefixes)
+            if ranked is None:
+                ranked = self.short_prefixes[prefixes] = self.ranked(prefixes)
+        else:
+            ranked = self.ranked(prefixes)
+
+        suggestions = []
+        for entry_id in ranked:
+            entry = self.entries[entry_id]
+            if kinds is None or entry["kind"] in kinds:
+                suggestions.append(entry)
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+    def ranked(self, prefixes):
+        """entry_id всех значений с ключом на один из префиксов, в порядке выдачи."""
+        best = {}  # entry_id -> совпадение с начала значения (start == 0)
+        for prefix in prefixes:
+            i = bisect_left(self.keys, prefix)
+            while i < len(self.keys) and self.keys[i].startswith(prefix):
+                start, entry_id = self.matches[i]
+                best[entry_id] = best.get(entry_id, False) or start == 0
+                i += 1
+
+        candidates = sorted(
+            (-self.entries[entry_id]["count"], not from_start, self.entries[entry_id]["value"], entry_id)
+            for entry_id, from_start in best.items()
+        )
+        return [entry_id for *_, entry_id in candidates]
+
+
+def load_suggestions(db: Session):
+    """(kind, значение, число программ) для всех видов подсказок — по одному GROUP BY на вид."""
+    count = func.count(Program.id.distinct())
+    queries = {
+        "program": db.query(Program.name, count).group_by(Program.name),
+        "university": db.query(University.name, count).join(Program, Program.university_id == University.id).group_by(University.name),
+        "field": db.query(FieldOfStudy.name, count)
+            .join(program_fields, program_fields.c.field_id == FieldOfStudy.id)
+            .join(Program, Program.id == program_fields.c.program_id)
+            .group_by(FieldOfStudy.name),
+        "subject": db.query(Subject.name, count)
+            .join(program_subjects, program_subjects.c.subject_id == Subject.id)
+            .join(Program, Program.id == program_subjects.c.program_id)
+            .group_by(Subject.name),
+        "location": db.query(Location.name, count).join(Program, Program.location_id == Location.id).group_by(Location.name),
+    }
+    for kind in KINDS:
+        for value, programs in queries[kind]:
+            yield kind, value, programs
+
+
+# Текущий индекс подсказок (None — ещё не построен)
+_autocomplete_index = None
+
+
+def get_autocomplete_index():
+    return _autocomplete_index
+
+
+def set_autocomplete_index(autocomplete_index):
+    global _autocomplete_index
+    _autocomplete_index = autocomplete_index
+
+
+def rebuild_autocomplete_index():
+    """Строит индекс подсказок из БД и атомарно подменяет текущий."""
+    global _autocomplete_index
+    started = time.perf_counter()
+    db = ReadSessionLocal()
+    try:
+        _autocomplete_index = AutocompleteIndex(load_suggestions(db))
+    finally:
+        db.close()
+    logger.info("Индекс подсказок построен", extra={"fields": {
+        "suggestions": len(_autocomplete_index),
+        "keys": len(_autocomplete_index.keys),
+        "duration_s": round(time.perf_counter() - started, 4),
+    }})
+    return _autocomplete_index
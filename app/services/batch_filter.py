@@ -0,0 +1,134 @@
+"""Пакетная проверка многих профилей абитуриентов по каталогу.
+
+    python -m app.services.batch_filter --input profiles.jsonl --output results.jsonl
+
+Каждая строка входа — фильтр в формате /programs/filter (можно с "profile_id"),
+каждая строка выхода — результат для соответствующего профиля. Каталог и пороги
+загружаются один раз; маски фасетов и порогов, полнотекстовый поиск и результаты
+одинаковых профилей вычисляются один раз на весь пакет.
+"""
+import argparse
+import json
+import logging
+import sys
+from itertools import islice
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.database.database import ReadSessionLocal
+from app.database.fts import search_program_ids
+from app.services.filter_cache import cache_key
+from app.services.program_index import ProgramIndex, get_or_build_program_index, popcount
+
+logger = logging.getLogger(__name__)
+
+
+def iter_profiles(lines):
+    """(номер строки, фильтр, ошибка) для каждой непустой строки JSONL."""
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(payload, dict):
+            yield line_number, None, "Profile must be a JSON object"
+            continue
+        yield line_number, payload, None
+
+
+class BatchEvaluator:
+    """Проверяет профили по одному индексу с общими для всего пакета кэшами."""
+
+    def __init__(self, program_index: ProgramIndex, db: Session, sort: str = "id", limit: int = None, include_programs: bool = False):
+        self.program_index = program_index
+        self.db = db
+        self.sort = sort
+        self.limit = limit
+        self.include_programs = include_programs
+        self.masks = {}  # общие маски фасетов и порогов (см. ProgramIndex.match_mask)
+        self.search_ids = {}  # текст q -> id программ
+        self.results = {}  # канонический ключ профиля -> результат
+
+    def evaluate(self, filters: dict) -> dict:
+        key = cache_key(filters)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        program_ids = None
+        if filters.get("q"):
+            if filters["q"] not in self.search_ids:
+                self.search_ids[filters["q"]] = search_program_ids(self.db, filters["q"])
+            program_ids = self.search_ids[filters["q"]]
+
+        mask = self.program_index.match_mask(filters, program_ids, memo=self.masks)
+        rows = list(islice(self.program_index.iter_sorted(mask, self.sort), self.limit))
+        result = {"count": popcount(mask)}
+        if self.include_programs:
+            result["programs"] = rows
+        else:
+            result["program_ids"] = [row["id"] for row in rows]
+        self.results[key] = result
+        return result
+
+    def run(self, lines):
+        """Результат для каждой строки входа в том же порядке."""
+        for line_number, filters, error in iter_profiles(lines):
+            if error is not None:
+                yield {"line": line_number, "error": error}
+                continue
+            profile_id = filters.pop("profile_id", None)
+            # Ошибка в одном профиле не должна обрывать поток результатов остальных
+            try:
+                result = self.evaluate(filters)
+            except HTTPException as e:
+                yield {"line": line_number, "profile_id": profile_id, "error": e.detail}
+                continue
+            except Exception as e:
+                logger.warning("Профиль не проверен", extra={"fields": {"line": line_number, "error": repr(e)}})
+                yield {"line": line_number, "profile_id": profile_id, "error": f"Invalid profile: {e}"}
+                continue
+            yield {"line": line_number, "profile_id": profile_id, **result}
+
+
+def iter_batch_results(lines, sort: str = "id", limit: int = None, include_programs: bool = False):
+    """JSONL-строки результатов. Если индекс не построен (USE_PROGRAM_INDEX=0), берёт запасной (см. get_or_build_program_index)."""
+    db = ReadSessionLocal()
+    try:
+        program_index = get_or_build_program_index(db)
+        evaluator = BatchEvaluator(program_index, db, sort, limit, include_programs)
+        for result in evaluator.run(lines):
+            yield json.dumps(result, ensure_ascii=False, separators=(",", ":")) + "\n"
+        logger.info("Пакет профилей проверен", extra={"fields": {
+            "distinct_profiles": len(evaluator.results),
+            "cached_masks": len(evaluator.masks),
+        }})
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    from app.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Проверить профили из JSONL по каталогу программ")
+    parser.add_argument("--input", help="JSONL с фильтрами (по умолчанию stdin)")
+    parser.add_argument("--output", help="Файл для JSONL-результатов (по умолчанию stdout)")
+    parser.add_argument("--sort", default="id", choices=["id", "name", "deadline", "tuition"])
+    parser.add_argument("--limit", type=int, help="Сколько программ отдавать на профиль")
+    parser.add_argument("--include-programs", action="store_true", help="Отдавать программы целиком, а не только id")
+    args = parser.parse_args()
+    setup_logging()
+
+    source = open(args.input, "r", encoding="utf-8") if args.input else sys.stdin
+    target = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        target.writelines(iter_batch_results(source, args.sort, args.limit, args.include_programs))
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            target.close()
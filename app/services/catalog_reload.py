@@ -0,0 +1,234 @@
+"""Перезагрузка каталога без рестарта сервера.
+
+Импорт новых и изменённых JSON-файлов идёт в фоне одной транзакцией (см.
+import_all_programs): пока она не закоммичена, читающие соединения (WAL) видят
+прежний каталог. В той же незакоммиченной транзакции строятся новые индексы программ
+и подсказок, а коммит, подмена индексов и поколения данных выполняются в цикле событий
+без await между ними — SQL-ветка, поиск и индекс переходят на новый каталог вместе.
+
+В режиме снимка (CATALOG_SNAPSHOT) снимок неизменяем, поэтому в фоне текущий снимок
+копируется в новый файл, в копию инкрементально импортируются изменённые файлы (программы
+сохраняют id), индексы строятся по ней (build_catalog), а при подмене меняется
+и подключённый файл: соединения переподключают его при следующей выдаче из пула.
+После подмены путь CATALOG_SNAPSHOT указывает на новый снимок (жёсткая ссылка),
+так что рестарт подхватывает последний каталог.
+"""
+import asyncio
+import glob
+import logging
+import os
+import time
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config import CATALOG_SNAPSHOT, CATALOG_WATCH_INTERVAL, USE_PROGRAM_INDEX
+from app.database.build_catalog import build_catalog
+from app.database.database import SessionLocal, ReadSessionLocal, get_catalog_snapshot, set_catalog_snapshot
+from app.database.generation import get_data_generation, read_generation, set_data_generation
+from app.database.import_data import import_programs
+from app.database.import_data.start_import import start_import
+from app.services.autocomplete import AutocompleteIndex, load_suggestions, set_autocomplete_index
+from app.services.metrics import catalog_reloads_total, catalog_reload_seconds
+from app.services.program_index import build_program_index, set_program_index
+
+logger = logging.getLogger(__name__)
+
+# Состояние последней перезагрузки — отдаётся в /admin/catalog/reload
+_status = {"state": "idle"}
+_reload_task = None
+
+
+def reload_status() -> dict:
+    return dict(_status, timings_s=dict(_status.get("timings_s", {})))
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+def _stage(name: str):
+    _status["stage"] = name
+    logger.info("Перезагрузка каталога: этап", extra={"fields": {"stage": name}})
+
+
+def build_indexes(db):
+    program_index = build_program_index(db) if USE_PROGRAM_INDEX else None
+    return program_index, AutocompleteIndex(load_suggestions(db))
+
+
+def prepare_reload():
+    """Импорт и построение новых индексов (в фоновом потоке). None — каталог не изменился, иначе
+    (поколение, индекс программ, индекс подсказок, незакоммиченная сессия импорта или None, новый снимок или None)."""
+    if CATALOG_SNAPSHOT:
+        return prepare_snapshot_reload()
+    timings = _status["timings_s"]
+
+    started = time.perf_counter()
+    _stage("import")
+    db = SessionLocal()
+    try:
+        changed = start_import(session=db)
+        timings["import"] = round(time.perf_counter() - started, 4)
+        _status["changed"] = changed
+
+        # Индексы строятся по незакоммиченному импорту: его видит только эта сессия
+        stage_started = time.perf_counter()
+        _stage("index")
+        generation = read_generation(db)
+        if generation == get_data_generation():
+            # Данные те же (могли обновиться лишь mtime в манифесте) — подмена не нужна
+            db.commit()
+            db.close()
+            return None
+        program_index, autocomplete_index = build_indexes(db)
+        timings["index"] = round(time.perf_counter() - stage_started, 4)
+    except BaseException:
+        db.close()
+        raise
+    return generation, program_index, autocomplete_index, db, None
+
+
+def next_snapshot_path() -> str:
+    root, ext = os.path.splitext(CATALOG_SNAPSHOT)
+    return f"{root}.{time.time_ns()}{ext}"
+
+
+def prepare_snapshot_reload():
+    timings = _status["timings_s"]
+
+    # Сравниваем файлы с манифестом подключённого снимка — без изменений новый не собираем
+    started = time.perf_counter()
+    _stage("scan")
+    db = ReadSessionLocal()
+    try:
+        changed, removed, _ = import_programs.scan_data_dir(db)
+    finally:
+        db.close()
+    timings["scan"] = round(time.perf_counter() - started, 4)
+    _status["changed"] = len(changed) + len(removed)
+    if not changed and not removed:
+        return None
+
+    stage_started = time.perf_counter()
+    _stage("import")
+    path = next_snapshot_path()
+    generation = get_data_generation() + 1
+    try:
+        build_catalog(path, generation, base=get_catalog_snapshot())
+    except SystemExit as e:
+        # build_catalog — ещё и CLI: пустой каталог завершает его через SystemExit
+        raise RuntimeError(str(e)) from None
+    timings["import"] = round(time.perf_counter() - stage_started, 4)
+
+    stage_started = time.perf_counter()
+    _stage("index")
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        db = sessionmaker(bind=engine)()
+        try:
+            program_index, autocomplete_index = build_indexes(db)
+        finally:
+            db.close()
+    finally:
+        engine.dispose()
+    timings["index"] = round(time.perf_counter() - stage_started, 4)
+    return generation, program_index, autocomplete_index, None, path
+
+
+def publish_snapshot(path: str):
+    """CATALOG_SNAPSHOT -> новый снимок; прежние версии удаляются (открытые соединения
+    дочитывают их по уже открытому дескриптору)."""
+    link = f"{CATALOG_SNAPSHOT}.tmp"
+    if os.path.exists(link):
+        os.remove(link)
+    os.link(path, link)
+    os.replace(link, CATALOG_SNAPSHOT)
+    root, ext = os.path.splitext(CATALOG_SNAPSHOT)
+    for stale in glob.glob(f"{glob.escape(root)}.*{ext}"):
+        if stale != path and stale != CATALOG_SNAPSHOT and stale[len(root) + 1:-len(ext) or None].isdigit():
+            os.remove(stale)
+
+
+async def run_reload(trigger: str):
+    started = time.perf_counter()
+    result = "failed"
+    try:
+        prepared = await asyncio.to_thread(prepare_reload)
+        if prepared is None:
+            result = "unchanged"
+        else:
+            # Коммит и подмена без await: обработчики запросов не увидят смесь старого и нового
+            _stage("swap")
+            generation, program_index, autocomplete_index, session, snapshot = prepared
+            if session is not None:
+                try:
+                    session.commit()
+                finally:
+                    session.close()
+            if snapshot is not None:
+                set_catalog_snapshot(snapshot)
+            if USE_PROGRAM_INDEX:
+                set_program_index(program_index)
+            set_autocomplete_index(autocomplete_index)
+            set_data_generation(generation)
+            _status.update(generation=generation, snapshot=get_catalog_snapshot())
+            result = "succeeded"
+            if snapshot is not None:
+                await asyncio.to_thread(publish_snapshot, snapshot)
+    except Exception as e:
+        _status["error"] = repr(e)
+        logger.exception("Ошибка при перезагрузке каталога")
+    finally:
+        _status["timings_s"]["total"] = round(time.perf_counter() - started, 4)
+        _status.update(state=result, stage=None, finished_at=_now())
+        catalog_reloads_total.inc(trigger, result)
+        catalog_reload_seconds.clear()
+        for stage, seconds in _status["timings_s"].items():
+            catalog_reload_seconds.set(seconds, stage)
+        logger.info("Перезагрузка каталога завершена", extra={"fields": {
+            key: value for key, value in _status.items() if key != "stage"
+        }})
+
+
+def start_reload(trigger: str) -> bool:
+    """Запускает перезагрузку в фоне; False — она уже идёт."""
+    global _reload_task
+    if _reload_task is not None and not _reload_task.done():
+        return False
+    _status.clear()
+    _status.update(
+        state="running", trigger=trigger, stage=None, started_at=_now(), finished_at=None,
+        generation=get_data_generation(), changed=None, error=None, timings_s={},
+        snapshot=get_catalog_snapshot(),
+    )
+    _reload_task = asyncio.create_task(run_reload(trigger))
+    return True
+
+
+def data_dir_signature():
+    """Дешёвый отпечаток каталога JSON-файлов: (число файлов, сумма размеров, последний mtime)."""
+    count, size, mtime = 0, 0, 0.0
+    for entry in os.scandir(import_programs.DATA_DIR):
+        if entry.name.endswith(".json"):
+            stat = entry.stat()
+            count += 1
+            size += stat.st_size
+            mtime = max(mtime, stat.st_mtime)
+    return count, size, mtime
+
+
+async def catalog_watch_loop(interval: float = CATALOG_WATCH_INTERVAL):
+    """Опрашивает каталог файлов и перезагружает его, когда изменения затихли на один период
+    (чтобы не импортировать файлы, которые ещё дописываются)."""
+    loaded = await asyncio.to_thread(data_dir_signature)
+    previous = loaded
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            signature = await asyncio.to_thread(data_dir_signature)
+        except OSError:
+            logger.exception("Не удалось прочитать каталог JSON-файлов")
+            continue
+        if signature != loaded and signature == previous and start_reload("watch"):
+            loaded = signature
+        previous = signature
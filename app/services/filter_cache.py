@@ -0,0 +1,104 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from app.config import FILTER_CACHE_SIZE, FILTER_CACHE_TTL
+from app.database.generation import get_data_generation
+
+
+def canonicalize(value):
+    """Приводит payload к каноническому виду: ключи по алфавиту, списки отсортированы,
+    пустые значения (None, "", [], {}) убраны — они не меняют результат фильтра."""
+    if isinstance(value, dict):
+        items = ((key, canonicalize(item)) for key, item in value.items())
+        return {key: item for key, item in sorted(items) if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        return sorted((canonicalize(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    return value
+
+
+def cache_key(payload: dict) -> str:
+    canonical = json.dumps(canonicalize(payload), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def make_etag(key: str, generation: int) -> str:
+    # Ответ полностью определяется запросом и поколением данных
+    return f'"{generation}-{key[:32]}"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Проверка заголовка If-None-Match (список ETag через запятую, W/ и *)."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+class ResultCache:
+    """LRU-кэш с TTL, который сбрасывается при смене поколения данных.
+
+    get и set получают поколение, прочитанное в начале запроса: ответ, посчитанный по
+    прежнему каталогу (перезагрузка прошла, пока запрос ждал БД), не попадёт в кэш нового."""
+
+    def __init__(self, maxsize: int = FILTER_CACHE_SIZE, ttl: float = FILTER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.generation = get_data_generation()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def _check_generation(self):
+        generation = get_data_generation()
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+    def get(self, key: str, generation: int):
+        with self.lock:
+            self._check_generation()
+            if generation != self.generation:
+                self.misses += 1
+                return None
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value, generation: int):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self._check_generation()
+            if generation != self.generation:
+                return  # Посчитано по прежнему поколению
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "generation": self.generation,
+            }
+
+
+# Кэш ответов /programs/filter и /programs/facets
+filter_cache = ResultCache()
+facets_cache = ResultCache()
@@ -0,0 +1,234 @@
+import orjson
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import or_, and_, func, select
+from fastapi import HTTPException
+from app.database.models import Program, FieldOfStudy, Subject, Requirement
+from app.utils import extract_number_from_string, extract_amount_from_string
+from app.database.fts import search_program_ids
+from app.database.locations import resolve_location_ids
+
+
+# Превращает программу в словарь для ответа API (поля и их порядок — как в schemas.ProgramOut)
+def serialize_program(program: Program):
+    return {
+        "id": program.id,
+        "name": program.name,
+        "university": program.university.name if program.university else None,
+        "location": program.location,
+        "duration": program.duration,
+        "duration_months": program.duration_months,
+        "tuition_fees": program.tuition_fees,
+        "tuition_amount": program.tuition_amount,
+        "tuition_currency": program.tuition_currency,
+        "language": program.language,
+        "mode_of_study": program.mode_of_study,
+        "uni_assist": program.uni_assist,
+        "application_deadline": program.application_deadline,
+        "link": program.link
+    }
+
+
+# JSON строки ответа (UTF-8, без пробелов) — фрагмент для склеивания в массив или NDJSON
+def encode_program(row: dict) -> bytes:
+    return orjson.dumps(row)
+
+
+# Извлекает из фильтра ограничения по бюджету и длительности: (max_tuition, валюта, max_duration в месяцах)
+def parse_range_filters(filters: dict):
+    max_tuition = extract_amount_from_string(filters.get("max_tuition"))
+    max_duration = extract_number_from_string(filters.get("max_duration"))
+    return max_tuition, (filters.get("tuition_currency") or "EUR").upper(), max_duration
+
+
+# Извлекает из фильтра пороги пользователя: (GPA, GRE, [(тест, балл), ...])
+def parse_user_requirements(filters: dict):
+    user_requirements = filters.get("requirements", {})
+    user_gpa = extract_number_from_string(user_requirements.get("GPA"))  # GPA пользователя
+    user_gre = extract_number_from_string(user_requirements.get("GRE"))  # GRE пользователя
+
+    user_tests = []
+    for lang, tests in user_requirements.get("language_requirements", {}).items():
+        if not isinstance(tests, dict):
+            continue
+        for test_name, user_score in tests.items():
+            # Балл разбирается так же, как пороги при импорте; без числа сравнивать не с чем
+            user_score = extract_number_from_string(user_score)
+            if user_score is not None:
+                user_tests.append((test_name.upper(), user_score))
+
+    return user_gpa, user_gre, user_tests
+
+
+# Поля сортировки для пагинации: последний ключ сортировки всегда id, поэтому порядок стабилен
+SORT_FIELDS = ("id", "name", "deadline", "tuition")
+
+
+def sort_value(row: dict, sort: str):
+    """Значение ключа сортировки для строки ответа (None сортируется в конец)."""
+    if sort == "name":
+        return row["name"]
+    if sort == "deadline":
+        return row["application_deadline"]
+    if sort == "tuition":
+        return row["tuition_amount"]
+    return row["id"]
+
+
+def sort_column(sort: str):
+    """SQL-выражение, сортирующее так же, как sort_value."""
+    if sort == "name":
+        return Program.name
+    if sort == "deadline":
+        return Program.application_deadline
+    if sort == "tuition":
+        return Program.tuition_amount
+    return Program.id
+
+
+# Фильтрация программ через SQL (запасной путь, если индекс не построен)
+def build_filter_query(db: Session, filters: dict):
+    # Университет (many-to-one) приходит в том же запросе через JOIN: число запросов не зависит
+    # от размера результата (selectinload добавлял запрос на каждую пачку из yield_per)
+    query = db.query(Program).options(joinedload(Program.university))
+    course_details = filters.get("course_details", {})
+
+    # 1️⃣ Фильтр по `location` (через справочник мест — IN по индексу location_id), `language` и `mode_of_study`
+    if course_details.get("location"):
+        query = query.filter(Program.location_id.in_(resolve_location_ids(db, course_details["location"])))
+    for column, values in (
+        (Program.language, course_details.get("language", [])),
+        (Program.mode_of_study, course_details.get("mode_of_study", [])),
+    ):
+        if values:
+            query = query.filter(or_(*[column.ilike(f"%{value}%") for value in values]))
+
+    # Полнотекстовый фильтр `q` через FTS5
+    if filters.get("q"):
+        query = query.filter(Program.id.in_(search_program_ids(db, filters["q"])))
+
+    # 2️⃣ Фильтр по `field_of_study` и `subject` (EXISTS вместо JOIN — без дублей строк)
+    if filters.get("field_of_study"):
+        query = query.filter(Program.fields_of_study.any(FieldOfStudy.name.ilike(f"%{filters['field_of_study']}%")))
+    if filters.get("subject"):
+        query = query.filter(Program.subjects.any(Subject.name.in_(filters["subject"])))
+
+    # Бюджет (за семестр, в валюте tuition_currency; программы без платы проходят всегда) и длительность.
+    # Неизвестные значения (NULL) не проходят — сравнивать их не с чем
+    max_tuition, currency, max_duration = parse_range_filters(filters)
+    if max_tuition is not None:
+        query = query.filter(
+            Program.tuition_amount <= max_tuition,
+            or_(Program.tuition_currency.is_(None), Program.tuition_currency == currency),
+        )
+    if max_duration is not None:
+        query = query.filter(Program.duration_months <= max_duration)
+
+    # 3️⃣ Фильтруем по `requirements` — пороги уже разобраны при импорте,
+    # поэтому все проверки выполняются как SQL-предикаты (NOT EXISTS)
+    user_gpa, user_gre, user_tests = parse_user_requirements(filters)
+
+    # 🔥 4️⃣ Фильтр по `GPA`
+    if user_gpa is not None:
+        query = query.filter(~Program.requirements.any(
+            and_(Requirement.kind == "GPA", Requirement.min_score > user_gpa)
+        ))
+
+    # 🔥 5️⃣ Фильтр по `GRE`: обязательный GRE без балла пользователя или с баллом ниже порога
+    if user_gre is None:
+        query = query.filter(~Program.requirements.any(
+            and_(Requirement.kind == "GRE", Requirement.is_mandatory.is_(True))
+        ))
+    else:
+        query = query.filter(~Program.requirements.any(
+            and_(Requirement.kind == "GRE", Requirement.is_mandatory.is_(True), Requirement.min_score > user_gre)
+        ))
+
+    # 🔥 6️⃣ Фильтр по IELTS, TOEFL и другим тестам
+    for test_name, user_score in user_tests:
+        query = query.filter(~Program.requirements.any(
+            and_(Requirement.kind == test_name, Requirement.min_score > user_score)
+        ))
+
+    return query
+
+
+def iter_programs_sql(db: Session, filters: dict, sort: str = "id", cursor: int = None, limit: int = None):
+    """Строки ответа в порядке (sort, id), начиная после программы cursor (keyset-пагинация)."""
+    query = build_filter_query(db, filters)
+    column = sort_column(sort)
+
+    if cursor is not None:
+        found = db.query(column).filter(Program.id == cursor).first()
+        if found is None:
+            raise HTTPException(status_code=400, detail="Unknown cursor")
+        value = found[0]
+        if value is None:
+            query = query.filter(column.is_(None), Program.id > cursor)
+        else:
+            query = query.filter(or_(
+                column > value,
+                and_(column == value, Program.id > cursor),
+                column.is_(None),
+            ))
+
+    query = query.order_by(column.is_(None), column, Program.id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    # 7️⃣ Отдаём отфильтрованные программы пачками, не загружая всё сразу (университет — из того же JOIN)
+    for program in query.yield_per(100):
+        yield serialize_program(program)
+
+
+# Полнотекстовый поиск через SQL: программы в порядке релевантности
+def search_programs_sql(db: Session, program_ids):
+    programs = (
+        db.query(Program)
+        .options(joinedload(Program.university))
+        .filter(Program.id.in_(program_ids))
+        .all()
+    )
+    by_id = {program.id: program for program in programs}
+    return [serialize_program(by_id[program_id]) for program_id in program_ids if program_id in by_id]
+
+
+def sort_facet_counts(counts):
+    """[(значение, число)] -> [{"value", "count"}] по убыванию числа, затем по значению."""
+    return [
+        {"value": value, "count": count}
+        for value, count in sorted(counts, key=lambda item: (-item[1], item[0]))
+    ]
+
+
+# Подсчёт фасетов через SQL: один GROUP BY на фасет по отфильтрованным программам
+def facet_counts_sql(db: Session, filters: dict):
+    matching_ids = build_filter_query(db, filters).with_entities(Program.id).subquery()
+    count = func.count(Program.id.distinct())
+    facets = {}
+
+    for facet, column in (
+        ("location", Program.location),
+        ("language", Program.language),
+        ("mode_of_study", Program.mode_of_study),
+    ):
+        rows = (
+            db.query(column, count)
+            .filter(Program.id.in_(select(matching_ids)), column.isnot(None))
+            .group_by(column)
+        )
+        facets[facet] = sort_facet_counts(rows)
+
+    for facet, relationship, column in (
+        ("field", Program.fields_of_study, FieldOfStudy.name),
+        ("subject", Program.subjects, Subject.name),
+    ):
+        rows = (
+            db.query(column, count)
+            .select_from(Program)
+            .join(relationship)
+            .filter(Program.id.in_(select(matching_ids)), column.isnot(None))
+            .group_by(column)
+        )
+        facets[facet] = sort_facet_counts(rows)
+
+    return facets
@@ -0,0 +1,163 @@
+from bisect import bisect_left
+from threading import Lock
+
+# Метрики в текстовом формате Prometheus (без внешних зависимостей).
+# Значения меток передаются позиционно в порядке labelnames
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames, labels, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.series = {}  # кортеж значений меток -> значение
+        self.lock = Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self):
+        with self.lock:
+            series = sorted(self.series.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}" for labels, value in series
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self.lock:
+            self.series[labels] = value
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными границами корзин (le), как в клиентах Prometheus."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Счётчики по корзинам (последняя — +Inf), сумма и число наблюдений
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self.lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self.series.items())
+        lines = self.header()
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = format_labels(self.labelnames, labels, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # функции, обновляющие gauge-метрики перед выдачей /metrics
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+http_requests_total = REGISTRY.register(Counter(
+    "http_requests_total", "Число HTTP-запросов", ("method", "route", "status"),
+))
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Время обработки запроса до отправки заголовков ответа",
+    ("method", "route"), LATENCY_BUCKETS,
+))
+http_request_sql_queries = REGISTRY.register(Histogram(
+    "http_request_sql_queries", "Число SQL-запросов на один HTTP-запрос", ("method", "route"), QUERY_COUNT_BUCKETS,
+))
+http_request_sql_duration = REGISTRY.register(Histogram(
+    "http_request_sql_duration_seconds", "Суммарное время SQL-запросов одного HTTP-запроса",
+    ("method", "route"), LATENCY_BUCKETS,
+))
+sql_slow_queries_total = REGISTRY.register(Counter(
+    "sql_slow_queries_total", "Число SQL-запросов дольше SLOW_QUERY_MS",
+))
+import_stage_seconds = REGISTRY.register(Gauge(
+    "import_stage_seconds", "Длительность этапов последнего импорта", ("importer", "stage"),
+))
+import_rows = REGISTRY.register(Gauge(
+    "import_rows", "Число строк, вставленных последним импортом", ("importer", "table"),
+))
+catalog_reloads_total = REGISTRY.register(Counter(
+    "catalog_reloads_total", "Число перезагрузок каталога без рестарта", ("trigger", "result"),
+))
+catalog_reload_seconds = REGISTRY.register(Gauge(
+    "catalog_reload_seconds", "Длительность этапов последней перезагрузки каталога", ("stage",),
+))
+admission_rejected_total = REGISTRY.register(Counter(
+    "admission_rejected_total", "Запросы, отклонённые контролем допуска", ("limiter", "reason"),
+))
+admission_wait_seconds = REGISTRY.register(Histogram(
+    "admission_wait_seconds", "Время ожидания в очереди допуска", ("limiter",), LATENCY_BUCKETS,
+))
+admission_state = REGISTRY.register(Gauge(
+    "admission_requests", "Запросы в обработке и в очереди допуска", ("limiter", "state"),
+))
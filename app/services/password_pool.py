@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from app.config import PASSWORD_POOL_SIZE, PASSWORD_QUEUE_LIMIT
+from app.utils import hash_password, verify_and_update_password
+
+# Отдельный пул процессов для bcrypt: хэширование не занимает ни event loop,
+# ни общий threadpool, через который идут запросы каталога.
+# Процессы запускаются через forkserver (или spawn), а не fork: fork копировал бы процесс
+# с работающим event loop, потоками и открытыми соединениями SQLite
+_pool = None
+# Операции, отправленные в пул и ещё не завершённые (меняется только в event loop)
+_pending = 0
+_rejected = 0
+
+
+def start_password_pool() -> ProcessPoolExecutor:
+    """Создаёт пул при старте приложения и сразу запускает его процессы,
+    чтобы первый вход не ждал их запуска."""
+    global _pool
+    if _pool is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        workers = max(1, PASSWORD_POOL_SIZE)
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        for _ in range(workers):
+            _pool.submit(os.getpid)
+    return _pool
+
+
+def get_password_pool() -> ProcessPoolExecutor:
+    # Без lifespan (например, в скриптах) пул создаётся при первом обращении
+    return _pool if _pool is not None else start_password_pool()
+
+
+def shutdown_password_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_in_password_pool(func, *args):
+    """Выполняет func в пуле; если очередь заполнена — сразу 503, а не ожидание."""
+    global _pending, _rejected
+    if _pending >= PASSWORD_QUEUE_LIMIT:
+        _rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Password service is overloaded, try again later",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_password_pool(), func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await run_in_password_pool(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    """(верен ли пароль, новый хэш или None) — см. verify_and_update_password."""
+    return await run_in_password_pool(verify_and_update_password, plain_password, hashed_password)
+
+
+def password_pool_stats():
+    return {
+        "workers": max(1, PASSWORD_POOL_SIZE),
+        "pending": _pending,
+        "queue_limit": PASSWORD_QUEUE_LIMIT,
+        "rejected": _rejected,
+    }
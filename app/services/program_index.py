@@ -0,0 +1,343 @@
+import logging
+import time
+from array import array
+from bisect import bisect_right
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, selectinload
+from app.database.database import ReadSessionLocal
+from app.database.generation import get_data_generation
+from app.database.models import Program
+from app.database.locations import load_location_aliases, match_location_ids
+from app.services.item_service import (
+    serialize_program, encode_program, parse_user_requirements, parse_range_filters, sort_value, sort_facet_counts,
+    SORT_FIELDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Число установленных битов (int.bit_count появился только в Python 3.10)
+def popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+# Возвращает позиции установленных битов маски по возрастанию.
+# Маска один раз переводится в байты и разбирается по 64-битным словам: сброс младшего бита
+# на всём int копировал бы его целиком на каждой позиции
+def iter_bits(mask: int):
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    for offset in range(0, len(data), 8):
+        word = int.from_bytes(data[offset:offset + 8], "little")
+        base = offset * 8
+        while word:
+            low = word & -word
+            yield base + low.bit_length() - 1
+            word ^= low
+
+
+# Флаги позиций маски: строка, в которой символ i — "1", если бит i установлен
+def bit_flags(mask: int, size: int) -> str:
+    return bin(mask)[:1:-1].ljust(size, "0")
+
+
+class ThresholdColumn:
+    """Пороги одного вида требований (GPA, IELTS, ...) в виде отсортированного массива.
+
+    suffix_masks[i] — битовая маска программ с порогом >= thresholds[i], поэтому
+    «все программы с порогом выше x» — это один bisect и одна маска.
+    positions[i] — позиция программы с порогом thresholds[i] (обход программ по возрастанию порога).
+    """
+
+    def __init__(self, entries):
+        entries = sorted(entries)
+        self.thresholds = array("d", (score for score, _ in entries))
+        self.positions = array("l", (pos for _, pos in entries))
+        self.suffix_masks = [0] * (len(entries) + 1)
+        for i in range(len(entries) - 1, -1, -1):
+            self.suffix_masks[i] = self.suffix_masks[i + 1] | (1 << entries[i][1])
+
+    def above(self, value: float) -> int:
+        return self.suffix_masks[bisect_right(self.thresholds, value)]
+
+    def at_most(self, value: float) -> int:
+        return self.suffix_masks[0] & ~self.above(value)
+
+
+class ProgramIndex:
+    """Read-only индекс каталога: битовые маски по фасетам и колонки порогов.
+
+    Бит i любой маски соответствует программе self.ids[i].
+    """
+
+    FACETS = ("location", "language", "mode_of_study", "field", "subject")
+
+    def __init__(self, programs, location_aliases=()):
+        self.ids = []
+        self.rows = []
+        self.postings = {facet: {} for facet in self.FACETS}
+        self.location_aliases = list(location_aliases)  # [(алиас, location_id)] из справочника мест
+        self.location_postings = {}  # location_id -> маска программ
+        self.required = {}  # kind -> маска программ с обязательным требованием этого вида
+        self.min_scores = []  # позиция -> {kind: наибольший порог} — для ранжирования рекомендаций
+        thresholds = {}  # kind -> [(min_score, позиция)]
+        mandatory_thresholds = {}
+        tuition = {}  # валюта -> [(плата за семестр, позиция)]
+        durations = []  # [(длительность в месяцах, позиция)]
+        self.free_tuition_mask = 0  # Программы без платы за обучение
+
+        for pos, program in enumerate(programs):
+            bit = 1 << pos
+            self.ids.append(program.id)
+            self.rows.append(serialize_program(program))
+            if program.location_id is not None:
+                self.location_postings[program.location_id] = self.location_postings.get(program.location_id, 0) | bit
+
+            for facet, values in (
+                ("location", [program.location]),
+                ("language", [program.language]),
+                ("mode_of_study", [program.mode_of_study]),
+                ("field", [field.name for field in program.fields_of_study]),
+                ("subject", [subject.name for subject in program.subjects]),
+            ):
+                postings = self.postings[facet]
+                for value in values:
+                    if value:
+                        postings[value] = postings.get(value, 0) | bit
+
+            if program.tuition_amount is not None:
+                if program.tuition_currency is None:
+                    self.free_tuition_mask |= bit
+                else:
+                    tuition.setdefault(program.tuition_currency, []).append((program.tuition_amount, pos))
+            if program.duration_months is not None:
+                durations.append((program.duration_months, pos))
+
+            min_scores = {}
+            self.min_scores.append(min_scores)
+            for requirement in program.requirements:
+                if requirement.is_mandatory:
+                    self.required[requirement.kind] = self.required.get(requirement.kind, 0) | bit
+                if requirement.min_score is None:
+                    continue
+                min_scores[requirement.kind] = max(requirement.min_score, min_scores.get(requirement.kind, requirement.min_score))
+                thresholds.setdefault(requirement.kind, []).append((requirement.min_score, pos))
+                if requirement.is_mandatory:
+                    mandatory_thresholds.setdefault(requirement.kind, []).append((requirement.min_score, pos))
+
+        # Готовые JSON-фрагменты строк: ответы склеивают их, не кодируя заново
+        self.fragments = [encode_program(row) for row in self.rows]
+        self.all_mask = (1 << len(self.ids)) - 1
+        self.pos_by_id = {program_id: pos for pos, program_id in enumerate(self.ids)}
+
+        # Порядок позиций для каждого поля сортировки и ранг позиции в этом порядке
+        self.sort_orders = {}
+        self.sort_ranks = {}
+        for sort in SORT_FIELDS:
+            keys = [sort_value(row, sort) for row in self.rows]
+            order = sorted(range(len(self.rows)), key=lambda pos: (keys[pos] is None, keys[pos] if keys[pos] is not None else 0, self.ids[pos]))
+            ranks = [0] * len(order)
+            for rank, pos in enumerate(order):
+                ranks[pos] = rank
+            self.sort_orders[sort] = order
+            self.sort_ranks[sort] = ranks
+        self.thresholds = {kind: ThresholdColumn(entries) for kind, entries in thresholds.items()}
+        self.mandatory_thresholds = {kind: ThresholdColumn(entries) for kind, entries in mandatory_thresholds.items()}
+        self.tuition = {currency: ThresholdColumn(entries) for currency, entries in tuition.items()}
+        self.duration = ThresholdColumn(durations)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def substring_mask(self, facet: str, needle: str) -> int:
+        """Аналог ilike('%needle%'): объединение масок всех значений, содержащих needle."""
+        needle = needle.lower()
+        mask = 0
+        for value, posting in self.postings[facet].items():
+            if needle in value.lower():
+                mask |= posting
+        return mask
+
+    def location_mask(self, value: str) -> int:
+        """Программы в местах, найденных по value в справочнике (см. match_location_ids)."""
+        mask = 0
+        for location_id in match_location_ids(self.location_aliases, value):
+            mask |= self.location_postings.get(location_id, 0)
+        return mask
+
+    def above(self, kind: str, value: float, mandatory_only: bool = False) -> int:
+        columns = self.mandatory_thresholds if mandatory_only else self.thresholds
+        column = columns.get(kind)
+        return column.above(value) if column else 0
+
+    def tuition_at_most(self, value: float, currency: str) -> int:
+        column = self.tuition.get(currency)
+        return self.free_tuition_mask | (column.at_most(value) if column else 0)
+
+    def mask_for_ids(self, program_ids) -> int:
+        mask = 0
+        for program_id in program_ids:
+            pos = self.pos_by_id.get(program_id)
+            if pos is not None:
+                mask |= 1 << pos
+        return mask
+
+    def fragments_for_ids(self, program_ids):
+        """JSON-фрагменты в порядке program_ids (например, по релевантности FTS)."""
+        return [self.fragments[self.pos_by_id[program_id]] for program_id in program_ids if program_id in self.pos_by_id]
+
+    def match_mask(self, filters: dict, program_ids=None, memo: dict = None) -> int:
+        """Маска программ, проходящих фильтр (та же семантика, что и build_filter_query в SQL-ветке).
+        program_ids — дополнительное ограничение, например результат полнотекстового поиска.
+        memo — общий словарь масок фасетов и порогов, когда подряд проверяется много фильтров."""
+        def cached(key, compute, *args):
+            if memo is None:
+                return compute(*args)
+            mask = memo.get(key)
+            if mask is None:
+                mask = memo[key] = compute(*args)
+            return mask
+
+        mask = self.all_mask if program_ids is None else self.mask_for_ids(program_ids)
+        course_details = filters.get("course_details", {})
+
+        # 1️⃣ location / language / mode_of_study — OR внутри фасета, AND между фасетами
+        if course_details.get("location"):
+            location_mask = 0
+            for value in course_details["location"]:
+                location_mask |= cached(("location", value.lower()), self.location_mask, value)
+            mask &= location_mask
+        for facet in ("language", "mode_of_study"):
+            values = course_details.get(facet, [])
+            if values:
+                facet_mask = 0
+                for value in values:
+                    facet_mask |= cached((facet, value.lower()), self.substring_mask, facet, value)
+                mask &= facet_mask
+
+        # 2️⃣ field_of_study (подстрока) и subject (точное совпадение)
+        if filters.get("field_of_study"):
+            mask &= cached(("field", filters["field_of_study"].lower()), self.substring_mask, "field", filters["field_of_study"])
+        if filters.get("subject"):
+            subject_mask = 0
+            for subject in filters["subject"]:
+                subject_mask |= self.postings["subject"].get(subject, 0)
+            mask &= subject_mask
+
+        # Бюджет и длительность (см. build_filter_query)
+        max_tuition, currency, max_duration = parse_range_filters(filters)
+        if max_tuition is not None:
+            mask &= cached(("tuition", max_tuition, currency), self.tuition_at_most, max_tuition, currency)
+        if max_duration is not None:
+            mask &= cached(("duration", max_duration), self.duration.at_most, max_duration)
+
+        # 3️⃣ Пороговые требования
+        user_gpa, user_gre, user_tests = parse_user_requirements(filters)
+        if user_gpa is not None:
+            mask &= ~cached(("GPA", user_gpa, False), self.above, "GPA", user_gpa)
+        if user_gre is None:
+            mask &= ~self.required.get("GRE", 0)
+        else:
+            mask &= ~cached(("GRE", user_gre, True), self.above, "GRE", user_gre, True)
+        for test_name, user_score in user_tests:
+            mask &= ~cached((test_name, user_score, False), self.above, test_name, user_score)
+
+        return mask
+
+    def iter_sorted(self, mask: int, sort: str = "id", cursor: int = None):
+        """Строки из mask в порядке (sort, id), начиная после программы cursor."""
+        for pos in self.iter_sorted_positions(mask, sort, cursor):
+            yield self.rows[pos]
+
+    def iter_fragments(self, mask: int, sort: str = "id", cursor: int = None):
+        """(id, JSON-фрагмент) в том же порядке, что и iter_sorted."""
+        for pos in self.iter_sorted_positions(mask, sort, cursor):
+            yield self.ids[pos], self.fragments[pos]
+
+    def iter_sorted_positions(self, mask: int, sort: str = "id", cursor: int = None):
+        start = 0
+        if cursor is not None:
+            if cursor not in self.pos_by_id:
+                raise HTTPException(status_code=400, detail="Unknown cursor")
+            start = self.sort_ranks[sort][self.pos_by_id[cursor]] + 1
+
+        if sort == "id":
+            # Позиции уже упорядочены по id — просто отрезаем биты до start
+            yield from iter_bits(mask >> start << start)
+            return
+
+        # Маска переводится в флаги один раз — проверка позиции не сдвигает весь int
+        order = self.sort_orders[sort]
+        flags = bit_flags(mask, len(order))
+        for rank in range(start, len(order)):
+            pos = order[rank]
+            if flags[pos] == "1":
+                yield pos
+
+    def facet_counts(self, mask: int):
+        """Для каждого фасета — значения и число программ из mask с этим значением."""
+        facets = {}
+        for facet, postings in self.postings.items():
+            counts = ((value, popcount(posting & mask)) for value, posting in postings.items())
+            facets[facet] = sort_facet_counts((value, count) for value, count in counts if count)
+        return facets
+
+
+# Текущий индекс (None — индекс не построен, используется SQL)
+_program_index = None
+
+
+def get_program_index():
+    return _program_index
+
+
+def build_program_index(db: Session) -> ProgramIndex:
+    programs = (
+        db.query(Program)
+        .options(
+            selectinload(Program.university),
+            selectinload(Program.fields_of_study),
+            selectinload(Program.subjects),
+            selectinload(Program.requirements),
+        )
+        .order_by(Program.id)
+        .all()
+    )
+    return ProgramIndex(programs, load_location_aliases(db))
+
+
+# Индекс для рекомендаций и пакетного фильтра, когда основной не строится (USE_PROGRAM_INDEX=0):
+# (поколение данных, индекс) — строится один раз на поколение, а не на каждый запрос
+_fallback_index = (None, None)
+
+
+def get_or_build_program_index(db: Session) -> ProgramIndex:
+    global _fallback_index
+    if _program_index is not None:
+        return _program_index
+    generation = get_data_generation()
+    built_for, program_index = _fallback_index
+    if program_index is None or built_for != generation:
+        program_index = build_program_index(db)
+        _fallback_index = (generation, program_index)
+    return program_index
+
+
+def set_program_index(program_index):
+    global _program_index
+    _program_index = program_index
+
+
+def rebuild_program_index():
+    """Строит индекс из БД и атомарно подменяет текущий."""
+    global _program_index
+    started = time.perf_counter()
+    db = ReadSessionLocal()
+    try:
+        _program_index = build_program_index(db)
+    finally:
+        db.close()
+    logger.info("Индекс программ построен", extra={"fields": {
+        "programs": len(_program_index),
+        "duration_s": round(time.perf_counter() - started, 4),
+    }})
+    return _program_index
@@ -0,0 +1,233 @@
+import heapq
+from itertools import product
+from app.services.item_service import parse_user_requirements
+from app.services.program_index import ProgramIndex, iter_bits, popcount, bit_flags
+
+# Запас над порогом, при котором критерий получает полный балл
+MARGIN_SCALES = {"GPA": 1.0, "GRE": 20.0, "IELTS": 1.5, "TOEFL": 20.0}
+# Балл критерия, если у программы нет порога этого вида: запас неизвестен
+UNKNOWN_MARGIN_SCORE = 0.5
+
+WEIGHTS = {
+    "GPA": 3.0,
+    "GRE": 2.0,
+    "IELTS": 2.0,
+    "TOEFL": 2.0,
+    "subject": 3.0,
+    "field": 2.0,
+    "location": 1.0,
+}
+
+
+def hard_filters(filters: dict) -> dict:
+    """Фильтр без пожеланий: location, field_of_study и subject не отсекают, а ранжируют."""
+    course_details = {key: value for key, value in filters.get("course_details", {}).items() if key != "location"}
+    return {
+        **{key: value for key, value in filters.items() if key not in ("field_of_study", "subject")},
+        "course_details": course_details,
+    }
+
+
+def margin_score(user_score: float, min_score, scale: float) -> float:
+    if min_score is None:
+        return UNKNOWN_MARGIN_SCORE
+    return max(0.0, min(1.0, (user_score - min_score) / scale))
+
+
+class Recommender:
+    """Top-k программ по качеству совпадения с профилем.
+
+    Кандидаты — программы, прошедшие жёсткие проверки (пороги, язык, форма обучения, q).
+    Пожелания (location, field, subject) вычисляются масками, и кандидаты делятся на группы
+    по тому, какие пожелания выполнены. Для группы известна верхняя граница балла
+    (запасы по порогам не больше 1), группы обходятся по убыванию границы.
+
+    Внутри группы программы обходятся по убыванию запаса: для каждого порога — по
+    отсортированному массиву ThresholdColumn (чем ниже порог, тем больше запас), по
+    очереди между порогами. Ещё не встреченная программа по каждому порогу наберёт не
+    больше запаса последней встреченной, отсюда верхняя граница её балла; обход
+    заканчивается, как только k-й лучший балл в куче её превысил (при равенстве — по id).
+    Так число проверенных программ растёт с k, а не с числом кандидатов.
+    Равные баллы упорядочиваются по id.
+    """
+
+    def __init__(self, program_index: ProgramIndex, filters: dict):
+        self.program_index = program_index
+        course_details = filters.get("course_details", {})
+        user_gpa, user_gre, user_tests = parse_user_requirements(filters)
+
+        # Запасы считаем только по тем порогам, которые пользователь указал
+        self.user_scores = {"GPA": user_gpa, "GRE": user_gre, **dict(user_tests)}
+        self.margin_kinds = [kind for kind in MARGIN_SCALES if self.user_scores.get(kind) is not None]
+
+        self.subject_masks = [program_index.postings["subject"].get(subject, 0) for subject in filters.get("subject") or []]
+        size = len(program_index)
+        self.subject_flags = [bit_flags(subject_mask, size) for subject_mask in self.subject_masks]
+        self.preference_masks = {}
+        if course_details.get("location"):
+            mask = 0
+            for location in course_details["location"]:
+                mask |= program_index.location_mask(location)
+            self.preference_masks["location"] = mask
+        if filters.get("field_of_study"):
+            self.preference_masks["field"] = program_index.substring_mask("field", filters["field_of_study"])
+        if self.subject_masks:
+            mask = 0
+            for subject_mask in self.subject_masks:
+                mask |= subject_mask
+            self.preference_masks["subject"] = mask
+
+        self.total_weight = sum(WEIGHTS[kind] for kind in self.margin_kinds) + sum(
+            WEIGHTS[preference] for preference in self.preference_masks
+        )
+        self.preference_flags = {preference: bit_flags(mask, size) for preference, mask in self.preference_masks.items()}
+        self.candidates = 0
+        self.scored = 0
+
+    def breakdown(self, pos: int) -> dict:
+        """Баллы критериев программы (от 0 до 1)."""
+        min_scores = self.program_index.min_scores[pos]
+        scores = {
+            kind: margin_score(self.user_scores[kind], min_scores.get(kind), MARGIN_SCALES[kind])
+            for kind in self.margin_kinds
+        }
+        for preference, flags in self.preference_flags.items():
+            if preference == "subject":
+                # Доля выбранных пользователем предметов, которые есть в программе
+                scores["subject"] = sum(flags[pos] == "1" for flags in self.subject_flags) / len(self.subject_flags)
+            else:
+                scores[preference] = float(flags[pos] == "1")
+        return scores
+
+    def score(self, scores: dict) -> float:
+        if not self.total_weight:
+            return 0.0
+        return sum(WEIGHTS[criterion] * value for criterion, value in scores.items()) / self.total_weight
+
+    def groups(self, candidates: int):
+        """(баллы пожеланий, маска) для каждой комбинации выполненных пожеланий, по убыванию их веса.
+        Балл subject внутри группы — верхняя граница (доля предметов не больше 1)."""
+        preferences = list(self.preference_flags)
+        groups = []
+        for matched in product((True, False), repeat=len(preferences)):
+            mask = candidates
+            for preference, is_matched in zip(preferences, matched):
+                mask &= self.preference_masks[preference] if is_matched else ~self.preference_masks[preference]
+            if mask:
+                groups.append(({preference: float(is_matched) for preference, is_matched in zip(preferences, matched)}, mask))
+        groups.sort(key=lambda group: -self.score(group[0]))
+        return groups
+
+    def bound(self, preference_scores: dict, levels) -> float:
+        """Верхняя граница балла при запасах не выше levels — тем же сложением, что и score."""
+        return self.score({**dict(zip(self.margin_kinds, levels)), **preference_scores})
+
+    def margin_order(self, kind: str, mask: int, flags: str):
+        """(запас, позиция) программ из mask по убыванию запаса по порогу kind, при равном запасе — по id.
+
+        Запас программы задаёт её наибольший порог (min_scores), поэтому программа выдаётся один
+        раз — на записи со своим наибольшим порогом. Записи с равным запасом (в том числе все
+        с полным или нулевым запасом) выдаются одним блоком по маске, программы без порога —
+        блоком с запасом UNKNOWN_MARGIN_SCORE.
+        """
+        user_score, scale = self.user_scores[kind], MARGIN_SCALES[kind]
+        column = self.program_index.thresholds.get(kind)
+        unknown = mask & ~column.suffix_masks[0] if column else mask
+        size = len(column.thresholds) if column else 0
+        min_scores = self.program_index.min_scores
+        i = 0
+        while i < size:
+            margin = margin_score(user_score, column.thresholds[i], scale)
+            if unknown and margin < UNKNOWN_MARGIN_SCORE:
+                for pos in iter_bits(unknown):
+                    yield UNKNOWN_MARGIN_SCORE, pos
+                unknown = 0
+            # Конец блока записей с тем же запасом (запас по записям не возрастает)
+            lo, hi = i + 1, size
+            while lo < hi:
+                middle = (lo + hi) // 2
+                if margin_score(user_score, column.thresholds[middle], scale) < margin:
+                    hi = middle
+                else:
+                    lo = middle + 1
+            if lo == i + 1 and not unknown:
+                pos = column.positions[i]
+                if flags[pos] == "1" and min_scores[pos][kind] == column.thresholds[i]:
+                    yield margin, pos
+            else:
+                # Программы, у которых наибольший порог попал в блок
+                block = column.suffix_masks[i] & ~column.suffix_masks[lo] & mask
+                if margin == UNKNOWN_MARGIN_SCORE:
+                    block |= unknown
+                    unknown = 0
+                for pos in iter_bits(block):
+                    yield margin, pos
+            i = lo
+        for pos in iter_bits(unknown):
+            yield UNKNOWN_MARGIN_SCORE, pos
+
+    def group_positions(self, preference_scores: dict, mask: int, heap: list, k: int):
+        """Позиции группы по убыванию верхней границы балла. Останавливается, когда ни одна
+        из оставшихся программ не попадёт в кучу: её (балл, -id) меньше, чем у k-й."""
+        ids = self.program_index.ids
+        if not self.margin_kinds:
+            # Запасов нет: граница общая для группы, обходим по id
+            bound = self.bound(preference_scores, ())
+            for pos in iter_bits(mask):
+                if len(heap) == k and heap[0][:2] > (bound, -ids[pos]):
+                    return
+                yield pos
+            return
+
+        flags = bit_flags(mask, len(self.program_index))
+        seen = bytearray(len(self.program_index))
+        orders = [self.margin_order(kind, mask, flags) for kind in self.margin_kinds]
+        levels = [1.0] * len(orders)
+        last_id = -1  # Наибольший id среди последних выданных порядками
+        while True:
+            for i, order in enumerate(orders):
+                item = next(order, None)
+                if item is None:
+                    return  # Каждый порядок содержит все программы группы — все уже встречены
+                levels[i], pos = item
+                last_id = max(last_id, ids[pos])
+                if not seen[pos]:
+                    seen[pos] = 1
+                    yield pos
+            # Невстреченная программа набирает не больше границы, а при равенстве всех запасов
+            # уровням идёт в каждом порядке после выданной — её id больше last_id
+            if len(heap) == k and heap[0][:2] >= (self.bound(preference_scores, levels), -last_id):
+                return
+
+    def top_k(self, candidates: int, k: int):
+        """[(балл, позиция, баллы критериев)] — лучшие k по убыванию балла (при равном балле — меньший id)."""
+        self.candidates = popcount(candidates)
+        heap = []  # min-куча (балл, -id, позиция, баллы критериев) размера k
+        for preference_scores, mask in self.groups(candidates):
+            if len(heap) == k and heap[0][0] > self.bound(preference_scores, [1.0] * len(self.margin_kinds)):
+                break  # Ни одна оставшаяся программа не наберёт больше k-го балла
+            for pos in self.group_positions(preference_scores, mask, heap, k):
+                scores = self.breakdown(pos)
+                entry = (self.score(scores), -self.program_index.ids[pos], pos, scores)
+                self.scored += 1
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+        return [(score, pos, scores) for score, _, pos, scores in sorted(heap, key=lambda entry: (-entry[0], -entry[1]))]
+
+
+def recommend(program_index: ProgramIndex, filters: dict, k: int = 10, explain: bool = False, program_ids=None):
+    """Строки ответа top-k с полем score (и breakdown при explain); program_ids — результат FTS по q."""
+    recommender = Recommender(program_index, filters)
+    candidates = program_index.match_mask(hard_filters(filters), program_ids)
+    results = []
+    for score, pos, scores in recommender.top_k(candidates, k):
+        row = {**program_index.rows[pos], "score": round(score, 4)}
+        if explain:
+            row["breakdown"] = {
+                criterion: {"score": round(value, 4), "weight": WEIGHTS[criterion]}
+                for criterion, value in scores.items()
+            }
+        results.append(row)
+    return results, recommender
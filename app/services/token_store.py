@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import logging
+import uuid
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import insert, update, delete
+from app.config import REFRESH_TOKEN_EXPIRE_DAYS, TOKEN_FLUSH_BATCH, TOKEN_FLUSH_INTERVAL, TOKEN_CACHE_SIZE
+from app.database.database import AsyncSessionLocal
+from app.database.models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+# Кэш токенов (LRU, не больше TOKEN_CACHE_SIZE): jti_hash -> {"user_id", "family_id", "expires_at", "revoked"}.
+# Отвечает на проверки refresh без БД; промах — один запрос по первичному ключу
+_tokens = OrderedDict()
+# Токены с ещё не записанными в БД изменениями — их нельзя вытеснять, в БД их пока нет
+_dirty = set()
+# Отозванные семейства: family_id -> когда истекут все токены семейства
+_revoked_families = {}
+
+# Ещё не записанные в БД изменения (пишутся пачкой в flush_token_writes)
+_pending_inserts = []
+_pending_revoked_tokens = []
+_pending_revoked_families = []
+_flushing = False
+
+
+def hash_jti(jti: str) -> str:
+    return hashlib.sha256(jti.encode("utf-8")).hexdigest()
+
+
+def _pending_count() -> int:
+    return len(_pending_inserts) + len(_pending_revoked_tokens) + len(_pending_revoked_families)
+
+
+def _cache_token(jti_hash: str, record: dict):
+    """Кладёт запись в кэш и вытесняет давно не использованные (кроме ещё не записанных в БД)."""
+    _tokens[jti_hash] = record
+    _tokens.move_to_end(jti_hash)
+    excess = len(_tokens) - TOKEN_CACHE_SIZE
+    if excess > 0:
+        # Среди первых excess + len(_dirty) записей точно есть excess вытесняемых (если они вообще есть)
+        oldest = [key for key in islice(_tokens, excess + len(_dirty)) if key not in _dirty]
+        for key in oldest[:excess]:
+            del _tokens[key]
+
+
+async def issue_refresh_token(user_id: int, family_id: str = None):
+    """Регистрирует новый токен и возвращает (jti, expires_at); family_id=None — новое семейство."""
+    jti = uuid.uuid4().hex
+    record = {
+        "user_id": user_id,
+        "family_id": family_id or uuid.uuid4().hex,
+        "expires_at": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "revoked": False,
+    }
+    jti_hash = hash_jti(jti)
+    _dirty.add(jti_hash)
+    _cache_token(jti_hash, record)
+    _pending_inserts.append({"jti_hash": jti_hash, **record})
+    if _pending_count() >= TOKEN_FLUSH_BATCH:
+        await flush_token_writes()
+    return jti, record["expires_at"]
+
+
+async def _load_token(jti_hash: str):
+    """Запись о токене из кэша, а при промахе — из БД (и кладёт её в кэш)."""
+    record = _tokens.get(jti_hash)
+    if record is not None:
+        _tokens.move_to_end(jti_hash)
+        return record
+    async with AsyncSessionLocal() as db:
+        row = await db.get(RefreshToken, jti_hash)
+    if row is None:
+        return None
+    # Пока шёл запрос, запись могла появиться в кэше — она свежее строки из БД
+    record = _tokens.get(jti_hash)
+    if record is None:
+        record = {
+            "user_id": row.user_id,
+            "family_id": row.family_id,
+            "expires_at": row.expires_at,
+            "revoked": row.revoked,
+        }
+        _cache_token(jti_hash, record)
+    return record
+
+
+def revoke_family(family_id: str):
+    # Токены семейства больше не нужны в кэше: их отклонит проверка _revoked_families
+    _revoked_families[family_id] = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    for jti_hash in [jti_hash for jti_hash, record in _tokens.items() if record["family_id"] == family_id]:
+        if jti_hash in _dirty:
+            _tokens[jti_hash]["revoked"] = True
+        else:
+            del _tokens[jti_hash]
+    _pending_revoked_families.append(family_id)
+
+
+async def rotate_refresh_token(jti: str, user_id: int) -> str:
+    """Проверяет предъявленный токен, отзывает его и возвращает family_id для нового токена.
+
+    Отозванный токен, предъявленный повторно, — признак кражи: отзываем всё семейство.
+    """
+    if not jti:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    jti_hash = hash_jti(jti)
+    record = await _load_token(jti_hash)
+    if record is not None and record["expires_at"] < datetime.utcnow():
+        if jti_hash not in _dirty:
+            _tokens.pop(jti_hash, None)
+        record = None
+    if record is None or record["user_id"] != user_id:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if record["family_id"] in _revoked_families:
+        raise HTTPException(status_code=401, detail="Refresh token revoked")
+    if record["revoked"]:
+        revoke_family(record["family_id"])
+        await flush_token_writes()
+        raise HTTPException(status_code=401, detail="Refresh token reuse detected")
+
+    # Между проверкой и отзывом нет await — два одновременных refresh не пройдут оба
+    record["revoked"] = True
+    _dirty.add(jti_hash)
+    _pending_revoked_tokens.append(jti_hash)
+    return record["family_id"]
+
+
+async def flush_token_writes():
+    """Пишет накопленные изменения одной транзакцией. При ошибке они вернутся в очередь."""
+    global _flushing, _pending_inserts, _pending_revoked_tokens, _pending_revoked_families
+    if _flushing or not _pending_count():
+        return
+    _flushing = True
+    inserts, revoked_tokens, revoked_families = _pending_inserts, _pending_revoked_tokens, _pending_revoked_families
+    _pending_inserts, _pending_revoked_tokens, _pending_revoked_families = [], [], []
+    try:
+        async with AsyncSessionLocal() as db:
+            if inserts:
+                await db.execute(insert(RefreshToken), inserts)
+            if revoked_tokens:
+                await db.execute(update(RefreshToken).where(RefreshToken.jti_hash.in_(revoked_tokens)).values(revoked=True))
+            if revoked_families:
+                await db.execute(update(RefreshToken).where(RefreshToken.family_id.in_(revoked_families)).values(revoked=True))
+            await db.commit()
+        # Записанные токены снова можно вытеснять — кроме тех, что снова изменились, пока шла запись
+        _dirty.difference_update({row["jti_hash"] for row in inserts}, revoked_tokens)
+        _dirty.update(row["jti_hash"] for row in _pending_inserts)
+        _dirty.update(_pending_revoked_tokens)
+    except Exception:
+        logger.exception("Ошибка записи refresh-токенов, повторим при следующем сбросе")
+        _pending_inserts[:0] = inserts
+        _pending_revoked_tokens[:0] = revoked_tokens
+        _pending_revoked_families[:0] = revoked_families
+    finally:
+        _flushing = False
+
+
+async def purge_expired_tokens():
+    """Убирает истёкшие токены из кэша и из БД."""
+    now = datetime.utcnow()
+    for jti_hash in [jti_hash for jti_hash, record in _tokens.items() if record["expires_at"] < now]:
+        if jti_hash not in _dirty:
+            del _tokens[jti_hash]
+    for family_id in [family_id for family_id, expires_at in _revoked_families.items() if expires_at < now]:
+        del _revoked_families[family_id]
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(RefreshToken).where(RefreshToken.expires_at < now))
+        await db.commit()
+
+
+async def token_flush_loop(purge_every: int = 3600):
+    """Фоновая задача: периодически сбрасывает очередь записей и чистит истёкшие токены."""
+    ticks = 0
+    while True:
+        await asyncio.sleep(TOKEN_FLUSH_INTERVAL)
+        await flush_token_writes()
+        ticks += 1
+        if ticks * TOKEN_FLUSH_INTERVAL >= purge_every:
+            ticks = 0
+            try:
+                await purge_expired_tokens()
+            except Exception:
+                logger.exception("Ошибка очистки refresh-токенов")
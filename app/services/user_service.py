@@ -1,51 +1,60 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models import User
 from app.schemas import UserCreate
-from app.utils import hash_password, verify_password, create_access_token, create_refresh_token
+from app.services.password_pool import hash_password_async, verify_password_async
+from app.services.token_store import issue_refresh_token
+from app.utils import create_access_token, create_refresh_token
 from datetime import timedelta
 from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from fastapi import HTTPException
 
 
 # Функция для регистрации пользователя
-def create_user(db: Session, user_data: UserCreate):
+async def create_user(db: AsyncSession, user_data: UserCreate):
     # Проверяем, существует ли уже пользователь с таким именем
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    existing_user = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_user:
         raise HTTPException(
             status_code=400,
             detail="User with this username already exists"
         )
     
-    hashed_password = hash_password(user_data.password)
+    # bcrypt нагружает CPU — выполняем в отдельном пуле процессов
+    hashed_password = await hash_password_async(user_data.password)
     db_user = User(username=user_data.username, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 # Функция для аутентификации пользователя (логин)
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user:
         return None
+    is_valid, new_hash = await verify_password_async(password, user.hashed_password)
+    if not is_valid:
+        return None
+    # Стоимость bcrypt изменилась — сохраняем хэш, пересчитанный с новыми настройками
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
-# Функция для выдачи JWT-токена при успешном входе
-def generate_tokens(user: User, db: Session):
+# Функция для выдачи JWT-токена при успешном входе.
+# Refresh-токен регистрируется в token_store — таблица users при этом не пишется
+async def generate_tokens(user_id: int, username: str, family_id: str = None):
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
     access_token = create_access_token(
-        data={"sub": user.username, "user_id": user.id}, expires_delta=access_token_expires
+        data={"sub": username, "user_id": user_id}, expires_delta=access_token_expires
     )
+    jti, _ = await issue_refresh_token(user_id, family_id)
     refresh_token = create_refresh_token(
-        data={"sub": user.username, "user_id": user.id}, expires_delta=refresh_token_expires
+        data={"sub": username, "user_id": user_id, "jti": jti}, expires_delta=refresh_token_expires
     )
 
-    # Сохраняем Refresh Token в базе
-    user.refresh_token = refresh_token
-    db.commit()
-
     return access_token, refresh_token
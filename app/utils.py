@@ -1,10 +1,19 @@
+import re
+import unicodedata
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 import jwt
-from app.config import SECRET_KEY, ALGORITHM
+from app.config import SECRET_KEY, ALGORITHM, BCRYPT_ROUNDS
 
-# Настройки для хэширования паролей (bcrypt)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Настройки для хэширования паролей (bcrypt). min/max_rounds = BCRYPT_ROUNDS:
+# хэши с другой стоимостью считаются устаревшими и пересчитываются при входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 # Функция для хэширования пароля
 def hash_password(password: str) -> str:
@@ -14,6 +23,10 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# Проверка пароля с пересчётом хэша: (верен ли пароль, новый хэш или None)
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 # Функция для создания JWT-токена
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode = data.copy()
@@ -27,3 +40,99 @@ def create_refresh_token(data: dict, expires_delta: timedelta = None) -> str:
     expire = datetime.utcnow() + (expires_delta or timedelta(days=7))  # 7 дней по умолчанию
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+# Слова, по которым требование считается необязательным
+OPTIONAL_MARKERS = ("recommended", "optional", "helpful", "if available", "desirable", "not compulsory", "not mandatory")
+
+
+def extract_number_from_string(text: str):
+    """Извлекает числовое значение (GPA, GRE, IELTS и т. д.) из строки."""
+    if not text:
+        return None
+    numbers = re.findall(r"\d+\.?\d*", str(text))
+    return float(numbers[0]) if numbers else None
+
+
+def extract_amount_from_string(text: str):
+    """Как extract_number_from_string, но с разделителями тысяч: "1,500" -> 1500.0."""
+    if not text:
+        return None
+    return extract_number_from_string(re.sub(r"(?<=\d)[, ](?=\d{3}(?!\d))", "", str(text)))
+
+
+def parse_requirement(kind: str, value: str):
+    """Разбирает требование на (kind, min_score, is_mandatory) для хранения в БД."""
+    text = str(value)
+    is_mandatory = not any(marker in text.lower() for marker in OPTIONAL_MARKERS)
+    return kind.upper(), extract_number_from_string(text), is_mandatory
+
+
+# Валюты в строках tuition_fees и «бесплатные» значения
+CURRENCIES = {"EUR": "EUR", "€": "EUR", "GBP": "GBP", "£": "GBP", "USD": "USD", "$": "USD", "CHF": "CHF"}
+NO_TUITION = ("none", "no", "free", "0")
+# Маркер периода в тексте после суммы -> период
+TUITION_PERIODS = (
+    ("per month", "month"), ("monthly", "month"),
+    ("per year", "year"), ("academic year", "year"), ("per annum", "year"), ("annual", "year"),
+    ("total", "total"), ("whole", "total"), ("entire", "total"), ("complete", "total"),
+    ("programme", "total"), ("program", "total"),
+    ("semester", "semester"),
+)
+MONTHS_PER_UNIT = {"semester": 6, "year": 12, "month": 1}
+
+
+def parse_duration_months(text: str):
+    """"4 semesters" -> 24. Из нескольких вариантов ("3 semesters, 4 semesters") берётся самый короткий."""
+    if not text:
+        return None
+    months = [
+        int(count) * MONTHS_PER_UNIT[unit]
+        for count, unit in re.findall(r"(\d+)\s*(semester|year|month)", str(text).lower())
+    ]
+    return min(months) if months else None
+
+
+def parse_tuition(text: str, duration_months: int = None):
+    """Разбирает tuition_fees на (сумма за семестр, валюта, период в исходном тексте).
+
+    "6,000 EUR" -> (6000.0, "EUR", "semester") — DAAD указывает сумму за семестр, если период не назван;
+    "None" -> (0.0, None, None); "Varied" и текст без суммы -> (None, None, None).
+    """
+    if text is None:
+        return None, None, None
+    if str(text).strip().lower() in NO_TUITION:
+        return 0.0, None, None
+    match = re.search(r"(\d[\d,]*(?:\.\d+)?)\s*(EUR|GBP|USD|CHF|€|£|\$)", str(text))
+    if not match:
+        return None, None, None
+
+    amount = float(match.group(1).replace(",", ""))
+    # Период ищем в той же части текста, что и сумму (до "|" или конца строки)
+    tail = re.split(r"[|\n]", str(text)[match.end():])[0].lower()
+    # Берётся маркер, ближайший к сумме: "1,500 EUR per semester of the programme" — за семестр
+    period = min(
+        ((tail.find(marker), period) for marker, period in TUITION_PERIODS if marker in tail),
+        default=(0, "semester"),
+    )[1]
+
+    if period == "year":
+        amount /= 2
+    elif period == "month":
+        amount *= 6
+    elif period == "total":
+        amount = amount / (duration_months / 6) if duration_months else None
+    return (round(amount, 2) if amount is not None else None), CURRENCIES[match.group(2)], period
+
+
+# Немецкие умлауты и ß в принятой ASCII-записи (München -> Muenchen)
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def fold_text(text: str, expand_umlauts: bool = True) -> str:
+    """Ключ для сравнения написаний: нижний регистр, ASCII без диакритики, слова через пробел.
+    "Garching b. München" -> "garching b muenchen" (или "garching b munchen" без expand_umlauts)."""
+    text = unicodedata.normalize("NFC", str(text)).lower()
+    text = text.translate(UMLAUTS) if expand_umlauts else text.replace("ß", "ss")
+    text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    return " ".join(re.findall(r"[a-z0-9]+", text))
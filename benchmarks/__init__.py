@@ -0,0 +1 @@
+"""Бенчмарки импорта и API на синтетическом каталоге (см. benchmarks/run.py)."""
@@ -0,0 +1,190 @@
+"""Генератор синтетического каталога в формате static_files/json_data.
+
+    python -m benchmarks.generate_catalog --scale 10 --output /tmp/catalog_x10
+
+Каждая синтетическая программа строится из случайной реальной: структура JSON
+та же, а названия, университеты, требования, направления и дедлайны
+перевыбираются из распределений реального корпуса (с небольшим шумом в баллах),
+поэтому строки требований остаются реалистичными ("6.5", "80", "required", ...).
+При одинаковом --seed результат одинаковый.
+
+Каталог пишется во временную папку рядом с --output и подменяет его целиком.
+Перезаписать можно только каталог, созданный генератором (с файлом-меткой
+GENERATED_MARKER): реальный корпус и чужие непустые папки не трогаются.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+from datetime import date, timedelta
+from app.database.import_data.import_fos import FOS_FILE
+
+# Реальный корпус, из которого берутся шаблоны и распределения значений
+SOURCE_DIR = "app/database/static_files/json_data"
+# Метка каталога, созданного генератором: только такой можно перезаписать
+GENERATED_MARKER = ".generated_catalog"
+TITLE_SUFFIXES = ["", "", " (M.Sc.)", " (M.A.)", " – International Track", " (Double Degree)", " Online", " (Part-time)"]
+
+
+def load_corpus(source_dir: str):
+    """Реальные программы и пулы значений: путь в JSON -> список значений (с повторами)."""
+    programs = []
+    for name in sorted(os.listdir(source_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(source_dir, name), "r", encoding="utf-8") as f:
+                programs.append(json.load(f))
+    if not programs:
+        raise SystemExit(f"❌ В {source_dir} нет JSON-файлов программ")
+
+    pools = {}
+
+    def collect(path, value):
+        pools.setdefault(path, []).append(value)
+
+    for program in programs:
+        details = program["course_details"]
+        requirements = program["requirements"]
+        collect("title", details.get("course_title"))
+        collect("campus", (details.get("university"), details.get("location")))
+        for key in ("duration", "tuition_fees", "language_of_instruction", "mode_of_study"):
+            collect(key, details.get(key))
+        for language, detail in requirements.get("language_requirements", {}).items():
+            if isinstance(detail, dict):
+                for key, value in detail.items():
+                    collect(("language_requirements", language, key), value)
+            else:
+                collect(("language_requirements", language), detail)
+        for test, value in requirements.get("standardized_tests", {}).items():
+            collect(("standardized_tests", test), value)
+        collect("GPA", requirements.get("GPA"))
+        collect("uni_assist", requirements.get("application_process", {}).get("uni_assist"))
+        collect("deadline_count", len(requirements.get("application_deadline") or []))
+        collect("field_count", len(program.get("field_of_study", [])))
+        collect("subject_count", len(program.get("subject", [])))
+    return programs, pools
+
+
+def load_fields(fos_file: str = FOS_FILE):
+    """Направления и их предметы из справочника — чтобы пары field/subject были согласованы."""
+    with open(fos_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [(fos["name"], [subject["name"] for subject in fos["subjects"]]) for fos in data["fields_of_study"]]
+
+
+def jitter_score(value, rng: random.Random, step: float, low: float, high: float):
+    """Сдвигает первое число в строке требования на несколько шагов, сохраняя формат."""
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(min(high, max(low, value + step * rng.randint(-2, 2))), 1)
+    match = re.search(r"\d+\.?\d*", str(value))
+    if not match:
+        return value
+    number = min(high, max(low, float(match.group()) + step * rng.randint(-2, 2)))
+    formatted = f"{number:.1f}" if "." in match.group() else str(int(number))
+    return f"{value[:match.start()]}{formatted}{value[match.end():]}"
+
+
+# Шаг и допустимый диапазон шума для числовых требований
+SCORE_JITTER = {
+    ("language_requirements", "English", "IELTS"): (0.5, 4.0, 9.0),
+    ("language_requirements", "English", "Toefl"): (5, 40, 120),
+    "GPA": (0.1, 1.0, 4.0),
+}
+
+
+def make_program(index: int, templates, pools, fields, rng: random.Random):
+    program = copy.deepcopy(templates[index % len(templates)])
+    details = program["course_details"]
+    requirements = program["requirements"]
+
+    title = rng.choice(pools["title"]) or "Unknown Program"
+    # Первая копия корпуса — с исходными названиями, дальше добавляем варианты
+    details["course_title"] = title if index < len(templates) else title + rng.choice(TITLE_SUFFIXES)
+    details["university"], details["location"] = rng.choice(pools["campus"])
+    for key in ("duration", "tuition_fees", "language_of_instruction", "mode_of_study"):
+        details[key] = rng.choice(pools[key])
+
+    for language, detail in requirements.get("language_requirements", {}).items():
+        if isinstance(detail, dict):
+            for key in detail:
+                path = ("language_requirements", language, key)
+                value = rng.choice(pools[path])
+                detail[key] = jitter_score(value, rng, *SCORE_JITTER[path]) if path in SCORE_JITTER else value
+        else:
+            requirements["language_requirements"][language] = rng.choice(pools[("language_requirements", language)])
+    for test in requirements.get("standardized_tests", {}):
+        requirements["standardized_tests"][test] = rng.choice(pools[("standardized_tests", test)])
+    requirements["GPA"] = jitter_score(rng.choice(pools["GPA"]), rng, *SCORE_JITTER["GPA"])
+    requirements.setdefault("application_process", {})["uni_assist"] = rng.choice(pools["uni_assist"])
+
+    first_deadline = date(2025, 1, 15) + timedelta(days=rng.randrange(300))
+    requirements["application_deadline"] = [
+        (first_deadline + timedelta(days=180 * i)).isoformat() for i in range(rng.choice(pools["deadline_count"]))
+    ]
+
+    chosen_fields = rng.sample(fields, min(len(fields), max(1, rng.choice(pools["field_count"]))))
+    subjects = [subject for _, field_subjects in chosen_fields for subject in field_subjects]
+    program["field_of_study"] = [name for name, _ in chosen_fields]
+    program["subject"] = rng.sample(subjects, min(len(subjects), max(1, rng.choice(pools["subject_count"]))))
+    return program
+
+
+def check_output(output: str, source_dir: str):
+    """SystemExit, если output — реальный корпус или непустая папка, созданная не генератором."""
+    if not os.path.exists(output):
+        return
+    if not os.path.isdir(output):
+        raise SystemExit(f"❌ {output} существует и не является каталогом")
+    if os.path.isdir(source_dir) and os.path.samefile(output, source_dir):
+        raise SystemExit(f"❌ {output} — исходный корпус программ, перезаписывать его нельзя")
+    if os.listdir(output) and not os.path.exists(os.path.join(output, GENERATED_MARKER)):
+        raise SystemExit(f"❌ {output} не пуст и создан не генератором — укажите другой --output")
+
+
+def generate_catalog(output: str, scale: float = 10, seed: int = 42, source_dir: str = SOURCE_DIR) -> int:
+    """Пишет round(scale * размер реального корпуса) файлов в output и возвращает их число."""
+    output = os.path.abspath(output)
+    check_output(output, source_dir)
+    templates, pools = load_corpus(source_dir)
+    fields = load_fields()
+    rng = random.Random(seed)
+    count = max(1, round(len(templates) * scale))
+
+    parent = os.path.dirname(output)
+    os.makedirs(parent, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix=f".{os.path.basename(output)}.", dir=parent)
+    try:
+        os.chmod(workdir, 0o755)  # mkdtemp создаёт папку с правами 0700
+        for index in range(count):
+            program = make_program(index, templates, pools, fields, rng)
+            with open(os.path.join(workdir, f"program_{index:06d}.json"), "w", encoding="utf-8") as f:
+                json.dump(program, f, ensure_ascii=False, indent=4)
+        open(os.path.join(workdir, GENERATED_MARKER), "w").close()
+
+        # Прежний сгенерированный каталог убираем только после того, как новый готов
+        previous = None
+        if os.path.exists(output):
+            previous = f"{workdir}.old"
+            os.rename(output, previous)
+        os.rename(workdir, output)
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сгенерировать синтетический каталог программ")
+    parser.add_argument("--output", required=True, help="Каталог для JSON-файлов")
+    parser.add_argument("--scale", type=float, default=10, help="Во сколько раз больше реального корпуса")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    count = generate_catalog(args.output, args.scale, args.seed)
+    print(f"✅ Сгенерировано программ: {count} ({args.output})")
@@ -0,0 +1,257 @@
+"""Повторяемые бенчмарки импорта и API.
+
+    python -m benchmarks.run --scale 10 --output bench.json
+
+Генерирует синтетический каталог (benchmarks/generate_catalog.py), затем меряет
+import_fos, import_all_programs (холодный и повторный импорт), /programs/filter
+на наборе фильтров и /users/token через ASGI-клиент httpx в том же процессе.
+Для каждого сценария в JSON попадают p50/p95/p99, пропускная способность и число
+SQL-запросов, а в meta — коммит и параметры запуска, чтобы сравнивать результаты
+разных коммитов между собой.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Набор фильтров для /programs/filter: (query-параметры, тело запроса)
+FILTER_MIX = [
+    ({}, {}),
+    ({}, {"course_details": {"location": ["Berlin"]}}),
+    ({}, {"course_details": {"language": ["English"], "location": ["München", "Munich"]}}),
+    ({}, {"requirements": {"GPA": "2.5"}}),
+    ({}, {"requirements": {"GPA": "3.0", "GRE": "315"}}),
+    ({}, {"requirements": {"language_requirements": {"English": {"IELTS": "6.5"}}}}),
+    ({}, {"requirements": {"language_requirements": {"English": {"Toefl": "90", "IELTS": "7.0"}}, "GPA": "2.7"}}),
+    ({}, {"field_of_study": "Engineering", "requirements": {"GPA": "2.0"}}),
+    ({}, {"subject": ["Computer Science", "Mathematics"]}),
+    ({}, {"q": "data science"}),
+    ({}, {"max_tuition": "1500", "max_duration": "24"}),
+    ({"sort": "name", "limit": 50}, {"course_details": {"language": ["English"]}}),
+    ({"sort": "deadline", "limit": 20}, {"requirements": {"GPA": "2.5"}}),
+    ({"sort": "tuition", "limit": 100}, {}),
+]
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Перцентиль с линейной интерполяцией (q от 0 до 100)."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(latencies, wall_time: float, sql_counts, statuses=None) -> dict:
+    """Сводка сценария; latencies и wall_time в секундах, в результате — миллисекунды."""
+    latencies = sorted(latencies)
+    summary = {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "throughput_per_s": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        "sql_queries_mean": round(sum(sql_counts) / len(sql_counts), 2) if sql_counts else 0.0,
+        "sql_queries_max": max(sql_counts) if sql_counts else 0,
+    }
+    if statuses is not None:
+        summary["statuses"] = {str(status): statuses.count(status) for status in sorted(set(statuses))}
+    return summary
+
+
+@contextlib.contextmanager
+def quiet():
+    """Глушит отчёты импортёров (stdout и INFO-логи), чтобы в выводе был только результат."""
+    logging.disable(logging.INFO)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def configure_environment(args, workdir: str):
+    """Настройки приложения читаются из окружения при импорте app — задаём их до него."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["CATALOG_DATA_DIR"] = args.data_dir
+    os.environ["USE_PROGRAM_INDEX"] = "1" if args.index else "0"
+    os.environ["FILTER_CACHE_SIZE"] = os.environ.get("FILTER_CACHE_SIZE", "256") if args.cache else "0"
+    os.environ.pop("CATALOG_SNAPSHOT", None)
+    # Все запросы бенчмарка идут от одного клиента — ограничение скорости на клиента отключаем,
+    # лимиты одновременности (FILTER_CONCURRENCY и т. д.) остаются как на сервере
+    os.environ["FILTER_RATE"] = "0"
+    os.environ["SEARCH_RATE"] = "0"
+    os.environ["LOGIN_RATE"] = "0"
+    os.environ["REGISTER_RATE"] = "0"
+
+
+def fresh_session_factory(path: str):
+    """Пустая БД с профилем SQLite как у сервера и счётчиком запросов."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database.database import Base, connect_args, setup_engine
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}", connect_args=connect_args)
+    setup_engine(engine, read_only=False)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def bench_imports(args, workdir: str) -> dict:
+    from app.database.query_counter import count_queries
+    from app.database.import_data.import_fos import import_fos
+    from app.database.import_data.import_programs import import_all_programs
+
+    path = os.path.join(workdir, "import.db")
+    runs = {"import_fos": ([], []), "import_all_programs": ([], []), "import_all_programs_unchanged": ([], [])}
+
+    def measure(name, func, *func_args, **func_kwargs):
+        latencies, sql_counts = runs[name]
+        with quiet(), count_queries() as counter:
+            started = time.perf_counter()
+            func(*func_args, **func_kwargs)
+            latencies.append(time.perf_counter() - started)
+        sql_counts.append(counter.count)
+
+    for _ in range(args.import_repeats):
+        engine, session_factory = fresh_session_factory(path)
+        measure("import_fos", import_fos, session_factory)
+        measure("import_all_programs", import_all_programs, workers=args.workers, session_factory=session_factory)
+        # Повторный запуск без изменений — стоимость рестарта сервера
+        measure("import_all_programs_unchanged", import_all_programs, workers=args.workers, session_factory=session_factory)
+        engine.dispose()
+    os.remove(path)
+
+    return {name: summarize(latencies, sum(latencies), sql_counts) for name, (latencies, sql_counts) in runs.items()}
+
+
+async def run_load(send, total: int, concurrency: int) -> dict:
+    """Выполняет total запросов send(i) в concurrency параллельных воркерах."""
+    latencies, sql_counts, statuses = [], [], []
+    next_index = iter(range(total))
+
+    async def worker():
+        for index in next_index:
+            started = time.perf_counter()
+            response = await send(index)
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+            sql_counts.append(int(response.headers.get("x-sql-query-count", 0)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, sql_counts, statuses)
+
+
+async def bench_api(args) -> dict:
+    import httpx
+    from app.database.database import async_engine, async_read_engine
+
+    with quiet():
+        from app.main import app
+    # httpx пишет INFO на каждый запрос
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def send_filter(index):
+                params, payload = FILTER_MIX[index % len(FILTER_MIX)]
+                return await client.post("/programs/filter", params=params, json=payload)
+
+            # Прогрев: первый запрос каждого фильтра (ленивые импорты, кэш страниц SQLite)
+            for index in range(len(FILTER_MIX)):
+                await send_filter(index)
+            results["programs_filter"] = await run_load(send_filter, args.requests, args.concurrency)
+
+            credentials = {"username": "bench_user", "password": "bench_password"}
+            await client.post("/users/register", json=credentials)
+
+            async def send_login(index):
+                return await client.post("/users/token", json=credentials)
+
+            results["users_token"] = await run_load(send_login, args.login_requests, args.concurrency)
+
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки импорта и API на синтетическом каталоге")
+    parser.add_argument("--scale", type=float, default=10, help="Размер каталога относительно реального корпуса")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", help="Готовый каталог JSON (без него генерируется во временный)")
+    parser.add_argument("--import-repeats", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1, help="Процессы разбора JSON при импорте")
+    parser.add_argument("--requests", type=int, default=500, help="Запросов к /programs/filter")
+    parser.add_argument("--login-requests", type=int, default=50, help="Запросов к /users/token")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-index", dest="index", action="store_false", help="Фильтрация только через SQL")
+    parser.add_argument("--cache", action="store_true", help="Не отключать кэш ответов /programs/filter")
+    parser.add_argument("--output", help="Файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        generate = args.data_dir is None
+        if generate:
+            args.data_dir = os.path.join(workdir, "json_data")
+        configure_environment(args, workdir)
+        if generate:
+            from benchmarks.generate_catalog import generate_catalog
+
+            generate_catalog(args.data_dir, args.scale, args.seed)
+        programs = sum(1 for name in os.listdir(args.data_dir) if name.endswith(".json"))
+
+        results = bench_imports(args, workdir)
+        results.update(asyncio.run(bench_api(args)))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "programs": programs,
+            "scale": args.scale,
+            "seed": args.seed,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "program_index": args.index,
+            "filter_cache": args.cache,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
 import json
 from app.database.database import SessionLocal
-from app.database.models import Program
+from sqlalchemy import select
+from app.database.models import Program, Location
 
 def get_unique_values():
     db = SessionLocal()
     try:
         # Извлекаем уникальные значения (результат — список кортежей)
-        locations = db.query(Program.location).distinct().all()
+        # Места берём из справочника (только те, где есть программы)
+        locations = db.query(Location.name).filter(Location.id.in_(select(Program.location_id))).all()
         languages = db.query(Program.language).distinct().all()
         modes = db.query(Program.mode_of_study).distinct().all()
 
@@ -0,0 +1,30 @@
+"""Число SQL-запросов SQL-ветки /programs/filter не зависит от размера результата."""
+import os
+import tempfile
+
+# Отдельная БД и SQL-ветка вместо in-memory индекса — до импорта приложения
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["USE_PROGRAM_INDEX"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def filter_programs(client, filters):
+    response = client.post("/programs/filter", json=filters)
+    assert response.status_code == 200
+    return len(response.json()), int(response.headers["X-SQL-Query-Count"])
+
+
+def test_query_count_does_not_grow_with_result_size(client):
+    small, small_queries = filter_programs(client, {"max_duration": "12"})
+    large, large_queries = filter_programs(client, {})
+    assert 0 < small < 100 < large
+    assert small_queries == large_queries